@@ -7,7 +7,7 @@ MAINNET_CHAIN_ID = "fetchhub-4"
 TESTNET_CHAIN_ID = "dorado-1"
 
 
-def create_client(seed: str, chain_id: str = MAINNET_CHAIN_ID) -> Client:
+def client_spec(seed: str, chain_id: str = MAINNET_CHAIN_ID) -> dict:
     delegate_identity = Identity.from_seed(f"{seed}")
     delegate_address = delegate_identity.address
     delegate_pubkey = delegate_identity.public_key
@@ -19,23 +19,31 @@ def create_client(seed: str, chain_id: str = MAINNET_CHAIN_ID) -> Client:
         identity.public_key.encode()
     )
 
-    return Client(
-        delegate_address,
-        delegate_pubkey_b64,
-        signature,
-        signed_bytes,
-        identity,
-        chain_id,
-    )
-
-
-# create clients
-client1 = create_client("the wise mans fear none name")
-client2 = create_client("the name of the wind man fear")
+    return {
+        "delegate_address": delegate_address,
+        "delegate_pubkey": delegate_pubkey_b64,
+        "signature": signature,
+        "signed_obj_base64": signed_bytes,
+        "identity": identity,
+        "chain_id": chain_id,
+    }
+
+
+# create clients (concurrently)
+clients = Client.bootstrap_many(
+    [
+        client_spec("the wise mans fear none name"),
+        client_spec("the name of the wind man fear"),
+        # create clients with same seed phrase, should not be an issue
+        client_spec("the wise mans fear none name", TESTNET_CHAIN_ID),
+        client_spec("the name of the wind man fear", TESTNET_CHAIN_ID),
+    ]
+)
+errors = [result for result in clients if isinstance(result, Exception)]
+if errors:
+    raise RuntimeError(f"Failed to create clients: {errors}")
 
-# create clients with same seed phrase, should not be an issue
-client1_dorado = create_client("the wise mans fear none name", TESTNET_CHAIN_ID)
-client2_dorado = create_client("the name of the wind man fear", TESTNET_CHAIN_ID)
+client1, client2, client1_dorado, client2_dorado = clients
 
 # print some debug
 print("Client1", repr(client1))
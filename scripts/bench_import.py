@@ -0,0 +1,60 @@
+"""Import time benchmark."""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    "package": "import babble",
+    "identity": "from babble import Identity; Identity.from_seed('bench').address",
+    "client": "from babble import Client",
+}
+
+
+def measure(statement: str) -> float:
+    """Measure the import time (in ms) of a statement in a fresh interpreter."""
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            f"import time; s = time.perf_counter(); {statement}; "
+            "print(time.perf_counter() - s)",
+        ],
+        text=True,
+    )
+    return float(output.strip()) * 1000
+
+
+def main() -> None:
+    """Run the benchmark, optionally failing when a scenario exceeds a budget."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="SCENARIO=MS",
+        help="maximum median time for a scenario",
+    )
+    args = parser.parse_args()
+
+    budgets = {}
+    for budget in args.budget:
+        name, value = budget.split("=")
+        budgets[name] = float(value)
+
+    failed = False
+    for name, statement in SCENARIOS.items():
+        median = statistics.median(measure(statement) for _ in range(args.repeat))
+        status = ""
+        if name in budgets and median > budgets[name]:
+            status = f"  OVER BUDGET ({budgets[name]:.1f}ms)"
+            failed = True
+        print(f"{name:<10} {median:8.1f}ms{status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
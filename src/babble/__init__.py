@@ -1,2 +1,36 @@
-from .client import Client, Message  # noqa
-from .crypto import Identity  # noqa
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .chunking import ChunkAssembler  # noqa
+    from .client import Client, Message  # noqa
+    from .crypto import Identity  # noqa
+    from .outbox import Outbox  # noqa
+    from .store import MessageStore  # noqa
+
+# public names and the module they live in, these are only imported on first use so
+# that (for example) crypto only users never load the HTTP and pydantic stack
+_LAZY_ATTRIBUTES = {
+    "ChunkAssembler": ".chunking",
+    "Client": ".client",
+    "Message": ".client",
+    "Identity": ".crypto.identity",
+    "MessageStore": ".store",
+    "Outbox": ".outbox",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name: str):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # cache, subsequent lookups bypass __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from .config import AUTH_SERVER, DEFAULT_REQUEST_TIMEOUT
 from .crypto.identity import Identity
 from .encoding import from_base64, to_base64
+from .ratelimit import AUTH, get_limiter, is_overload_status
 
 
 class TokenMetadata(BaseModel):
@@ -20,7 +21,9 @@ class TokenMetadata(BaseModel):
 def send_post_request(url: str, data: dict) -> Optional[dict]:
     """Send a POST request to the given URL with the given data."""
     try:
-        response = requests.post(url, json=data, timeout=DEFAULT_REQUEST_TIMEOUT)
+        with get_limiter(AUTH).acquire() as slot:
+            response = requests.post(url, json=data, timeout=DEFAULT_REQUEST_TIMEOUT)
+            slot.overloaded = is_overload_status(response.status_code)
         return response.json()
     except requests.exceptions.RequestException as err:
         print(f"Error: {err}")
@@ -0,0 +1,141 @@
+import hashlib
+import io
+import uuid
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterator, Optional, Union
+
+from pydantic import BaseModel
+
+from .config import DEFAULT_MAX_PENDING_CHUNKS
+from .crypto.exceptions import ChunkError
+from .encoding import from_base64, to_base64
+
+if TYPE_CHECKING:
+    from .client import Message
+
+
+class ChunkInfo(BaseModel):
+    id: str  # transfer id
+    seq: int
+    final: bool = False
+    size: Optional[int] = None  # total payload size, only set on the final chunk
+    digest: Optional[str] = None  # sha256 (hex) of the payload, only on the final chunk
+
+
+def new_transfer_id() -> str:
+    return uuid.uuid4().hex
+
+
+def iter_chunk_contents(
+    transfer_id: str, data: Union[bytes, BinaryIO], chunk_size: int
+) -> Iterator[Dict[str, Any]]:
+    """Split the payload into message contents, reading the stream one chunk ahead."""
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be positive")
+
+    stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+
+    h = hashlib.sha256()
+    size = 0
+    seq = 0
+
+    current = stream.read(chunk_size)
+    while True:
+        upcoming = stream.read(chunk_size)
+
+        h.update(current)
+        size += len(current)
+
+        chunk = {"id": transfer_id, "seq": seq}
+        if not upcoming:
+            chunk.update({"final": True, "size": size, "digest": h.hexdigest()})
+
+        yield {"text": to_base64(current), "chunk": chunk}
+
+        if not upcoming:
+            return
+
+        current = upcoming
+        seq += 1
+
+
+class ChunkAssembler:
+    """Incrementally reassembles a chunked transfer into a binary sink.
+
+    Chunks are written to the sink as soon as they are in sequence, so only chunks
+    that arrive out of order are buffered (up to ``max_pending`` of them). If no
+    transfer id is given, the assembler follows the first transfer it sees.
+    """
+
+    def __init__(
+        self,
+        sink: BinaryIO,
+        transfer_id: Optional[str] = None,
+        max_pending: int = DEFAULT_MAX_PENDING_CHUNKS,
+    ):
+        self._sink = sink
+        self._transfer_id = transfer_id
+        self._max_pending = max_pending
+
+        self._pending: Dict[int, bytes] = {}
+        self._next_seq = 0
+        self._final: Optional[ChunkInfo] = None
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._complete = False
+
+    @property
+    def transfer_id(self) -> Optional[str]:
+        return self._transfer_id
+
+    @property
+    def complete(self) -> bool:
+        return self._complete
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def add(self, message: "Message") -> bool:
+        """Add a received message, returns False if it is not part of this transfer."""
+        chunk = message.chunk
+        if chunk is None:
+            return False
+
+        if self._transfer_id is None:
+            self._transfer_id = chunk.id
+        elif chunk.id != self._transfer_id:
+            return False
+
+        # ignore duplicated deliveries
+        if self._complete or chunk.seq < self._next_seq or chunk.seq in self._pending:
+            return True
+
+        if chunk.seq != self._next_seq and len(self._pending) >= self._max_pending:
+            raise ChunkError(
+                f"Too many out of order chunks for transfer {self._transfer_id}"
+            )
+
+        self._pending[chunk.seq] = from_base64(message.text)
+        if chunk.final:
+            self._final = chunk
+
+        # flush everything that is now in sequence
+        while self._next_seq in self._pending:
+            data = self._pending.pop(self._next_seq)
+            self._sink.write(data)
+            self._hash.update(data)
+            self._size += len(data)
+            self._next_seq += 1
+
+        if self._final is not None and self._next_seq > self._final.seq:
+            self._verify()
+
+        return True
+
+    def _verify(self):
+        if (
+            self._size != self._final.size
+            or self._hash.hexdigest() != self._final.digest
+        ):
+            raise ChunkError(f"Integrity check failed for transfer {self._transfer_id}")
+        self._complete = True
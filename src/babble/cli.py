@@ -0,0 +1,194 @@
+import argparse
+import base64
+import contextlib
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+from .client import Client
+from .config import DEFAULT_SEND_BATCH_SIZE, MAINNET_CHAIN_ID
+from .crypto.exceptions import SendError
+from .crypto.identity import Identity
+from .encoding import from_json, to_json
+
+DEFAULT_POLL_INTERVAL = 5.0
+MAX_POLL_BACKOFF = 300.0
+
+
+def create_client(seed: str, chain_id: str, name: Optional[str] = None) -> Client:
+    """Create a client using the same seed based delegation as the examples."""
+    delegate_identity = Identity.from_seed(seed)
+    delegate_pubkey_b64 = base64.b64encode(
+        bytes.fromhex(delegate_identity.public_key)
+    ).decode()
+
+    # the messaging key is derived per chain
+    identity = Identity.from_seed(f"{seed} {chain_id}")
+    signed_bytes, signature = delegate_identity.sign_arbitrary(
+        identity.public_key.encode()
+    )
+
+    return Client(
+        delegate_identity.address,
+        delegate_pubkey_b64,
+        signature,
+        signed_bytes,
+        identity,
+        chain_id,
+        name=name,
+    )
+
+
+def _read_records(stream: TextIO) -> Iterator[Tuple[str, str]]:
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            record = from_json(line)
+        except ValueError as err:
+            raise ValueError(f"Line {line_number}: invalid JSON ({err})") from err
+
+        if (
+            not isinstance(record, dict)
+            or "target" not in record
+            or "text" not in record
+        ):
+            raise ValueError(f"Line {line_number}: expected {{target, text}} record")
+
+        yield str(record["target"]), str(record["text"])
+
+
+def _load_cursor(path: str) -> Optional[datetime]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        value = f.read().strip()
+    return datetime.fromisoformat(value) if value else None
+
+
+def _save_cursor(path: str, value: datetime):
+    # write and swap so an interrupted tail never leaves a corrupted cursor
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(value.isoformat())
+    os.replace(tmp_path, path)
+
+
+def _read_valid_records(
+    stream: TextIO, errors: List[Exception]
+) -> Iterator[Tuple[str, str]]:
+    # stop at the first malformed line, so the records before it are still sent
+    try:
+        yield from _read_records(stream)
+    except ValueError as err:
+        errors.append(err)
+
+
+def cmd_send(client: Client, args: argparse.Namespace) -> int:
+    errors = []
+    try:
+        count, unroutable = client.send_many(
+            _read_valid_records(sys.stdin, errors), batch_size=args.batch_size
+        )
+    except SendError as err:
+        count, unroutable = err.sent, err.unroutable
+        errors.append(err)
+
+    # report the unroutable records in the input format, so they can be resent
+    for target, text in unroutable:
+        print(to_json({"target": target, "text": text}), file=sys.stderr)
+
+    print(f"Sent {count} messages, {len(unroutable)} unroutable", file=sys.stderr)
+    for err in errors:
+        print(f"Error: {err}", file=sys.stderr)
+
+    return 1 if unroutable or errors else 0
+
+
+def cmd_tail(client: Client, args: argparse.Namespace) -> int:
+    if args.cursor:
+        cursor = _load_cursor(args.cursor)
+        if cursor is not None:
+            client.last_rx_timestamp = cursor
+
+    delay = args.interval
+    while True:
+        try:
+            messages = client.receive()
+        except Exception as err:
+            # transient failures are retried, with exponential back off
+            print(f"Error: {err}", file=sys.stderr)
+            if args.once:
+                return 1
+
+            delay = min(MAX_POLL_BACKOFF, max(delay, args.interval) * 2)
+            time.sleep(delay)
+            continue
+
+        for message in messages:
+            sys.stdout.write(message.model_dump_json(exclude_none=True) + "\n")
+        sys.stdout.flush()
+
+        if args.cursor and messages:
+            _save_cursor(args.cursor, client.last_rx_timestamp)
+
+        if args.once:
+            return 0
+
+        delay = args.interval
+        time.sleep(delay)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="babble", description="Send and receive messages over Memorandum"
+    )
+    parser.add_argument(
+        "--seed",
+        default=os.environ.get("BABBLE_SEED"),
+        help="delegate seed phrase (defaults to the BABBLE_SEED environment variable)",
+    )
+    parser.add_argument("--chain-id", default=MAINNET_CHAIN_ID)
+    parser.add_argument("--name", default=None, help="client id used to authenticate")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    send = subparsers.add_parser(
+        "send", help="send JSONL {target, text} records read from stdin"
+    )
+    send.add_argument("--batch-size", type=int, default=DEFAULT_SEND_BATCH_SIZE)
+    send.set_defaults(handler=cmd_send)
+
+    tail = subparsers.add_parser(
+        "tail", help="write received messages to stdout as JSONL"
+    )
+    tail.add_argument("--cursor", help="file used to persist the receive position")
+    tail.add_argument("--interval", type=float, default=DEFAULT_POLL_INTERVAL)
+    tail.add_argument("--once", action="store_true", help="poll a single time")
+    tail.set_defaults(handler=cmd_tail)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.seed:
+        parser.error("a seed is required (--seed or BABBLE_SEED)")
+
+    # keep stdout clean for the JSONL output
+    with contextlib.redirect_stdout(sys.stderr):
+        client = create_client(args.seed, args.chain_id, args.name)
+
+    try:
+        return args.handler(client, args)
+    except KeyboardInterrupt:
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
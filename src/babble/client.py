@@ -1,21 +1,73 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import List
+from itertools import islice
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import bech32
 from pydantic import BaseModel
 
 from .auth import authenticate
-from .crypto.exceptions import RoutingError
+from .chunking import (
+    ChunkAssembler,
+    ChunkInfo,
+    iter_chunk_contents,
+    new_transfer_id,
+)
+from .config import (
+    CONTENTS_BATCH_SIZE,
+    DEFAULT_BOOTSTRAP_WORKERS,
+    DEFAULT_BROADCAST_WORKERS,
+    DEFAULT_CHUNK_BATCH_SIZE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_SEND_BATCH_SIZE,
+    MAX_DECOMPRESSED_SIZE,
+    PUBLIC_KEY_CACHE_TTL,
+)
+from .crypto.exceptions import RoutingError, SendError, UnsupportedQueryError
 from .crypto.identity import Identity
-from .encoding import from_base64, from_json, to_base64, to_json
+from .encoding import (
+    compress,
+    decompress,
+    from_base64,
+    from_json,
+    to_base64,
+    to_json,
+)
 from .mailbox import (
+    MessageHeader,
+    RawMessage,
     dispatch_messages,
-    list_messages,
+    iter_message_contents,
+    iter_message_headers,
+    iter_messages,
     lookup_messaging_public_key,
+    lookup_messaging_public_keys,
     register_messaging_public_key,
 )
+from .outbox import Outbox, OutboxFlusher
+from .ratelimit import error_status
+
+if TYPE_CHECKING:
+    from .store import MessageStore
 
 EXPIRATION_BUFFER_SECONDS = 60 * 5  # 5 minutes
+COMPRESSION_ZLIB = "zlib"
+
+logger = logging.getLogger(__name__)
 
 
 def _validate_address(address: str):
@@ -24,6 +76,36 @@ def _validate_address(address: str):
         raise ValueError(f"Bad delegate address {address}")
 
 
+def _batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    if size <= 0:
+        raise ValueError("Batch size must be positive")
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _build_content(text: str, compression_threshold: Optional[int]) -> Dict[str, Any]:
+    # compression is opt-in, small (or disabled) payloads keep the original format
+    raw_text = text.encode()
+    if compression_threshold is None or len(raw_text) <= compression_threshold:
+        return {"text": text}
+
+    compressed = compress(raw_text)
+    if len(compressed) >= len(raw_text):
+        return {"text": text}
+
+    return {"text": to_base64(compressed), "compression": COMPRESSION_ZLIB}
+
+
+def _extract_text(content: Dict[str, Any]) -> str:
+    compression = content.get("compression")
+    if compression is None:
+        return content["text"]
+    if compression == COMPRESSION_ZLIB:
+        return decompress(from_base64(content["text"]), MAX_DECOMPRESSED_SIZE).decode()
+    raise ValueError(f"Unsupported content compression {compression}")
+
+
 class Message(BaseModel):
     id: str
     sender: str
@@ -31,9 +113,18 @@ class Message(BaseModel):
     text: str
     sent_at: datetime
     expires_at: datetime
+    chunk: Optional[ChunkInfo] = None
 
 
 class Client:
+    """A messaging client for a single delegate.
+
+    Clients are thread-safe: a single instance can be shared by a pool of sender
+    threads. Token refreshes are single-flight (one login, with the other threads
+    waiting on it) and concurrent calls to ``receive`` are serialized so that each
+    message is only delivered once.
+    """
+
     def __init__(
         self,
         delegate_address: str,
@@ -43,6 +134,10 @@ class Client:
         identity: Identity,
         chain_id: str,
         name: str = None,
+        compression_threshold: Optional[int] = None,
+        outbox: Optional[Outbox] = None,
+        two_phase_fetch: bool = True,
+        store: Optional["MessageStore"] = None,
     ):
         _validate_address(delegate_address)
 
@@ -55,26 +150,94 @@ class Client:
         self._chain_id = chain_id
         self._name = name
 
+        # message texts larger than this (in bytes) are compressed, None disables
+        self._compression_threshold = compression_threshold
+
         # build and restore the delivered set
+        self._rx_lock = threading.Lock()
         self._last_rx_timestamp = self._now()
 
+        # fetch message headers first and only download the contents of new messages
+        self._two_phase_fetch = two_phase_fetch
+
+        # optional local history of the received messages
+        self._store = store
+
+        # recently looked up target keys, with the (monotonic) time of the lookup
+        self._public_keys: Dict[str, Tuple[str, float]] = {}
+
         # authenticate against the API
+        self._auth_lock = threading.Lock()
         self._token = None
-        self._token_metadata = {"expires_at": self._now()}
-        self._update_authentication()
+        self._token_metadata = None
+        token = self._update_authentication()
 
         # ensure the registration is in place
-        self._update_registration()
-
-    def _update_authentication(self):
-        if (
+        self._update_registration(token)
+
+        # with an outbox, sends are queued and dispatched in the background
+        self._outbox = outbox
+        self._outbox_flusher = None
+        if outbox is not None:
+            self._outbox_flusher = OutboxFlusher(outbox, self._dispatch_now).start()
+
+    @classmethod
+    def bootstrap_many(
+        cls,
+        specs: Iterable[Dict[str, Any]],
+        max_workers: int = DEFAULT_BOOTSTRAP_WORKERS,
+    ) -> List[Union["Client", Exception]]:
+        """Create many clients concurrently.
+
+        Each spec is the keyword arguments for a single ``Client``. Authentication and
+        registration run on a bounded thread pool. Returns one result per spec (in spec
+        order), either the ready client or the exception raised while creating it.
+        """
+        specs = list(specs)
+
+        def create(spec: Dict[str, Any]) -> "Client":
+            return cls(**spec)
+
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(create, spec) for spec in specs]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as err:
+                    results.append(err)
+
+        return results
+
+    def _token_expired(self) -> bool:
+        return (
             self._token is None
             or self._token_metadata.expires_at
-            < self._now() - timedelta(seconds=EXPIRATION_BUFFER_SECONDS)
-        ):
-            self._token, self._token_metadata = authenticate(self._identity, self._name)
-            if not self._token or not self._token_metadata:
-                raise ValueError("Failed to authenticate")
+            < self._now() + timedelta(seconds=EXPIRATION_BUFFER_SECONDS)
+        )
+
+    def _update_authentication(self) -> str:
+        """Return a valid token, refreshing it (once, for all threads) if needed."""
+        token = self._token
+        if not self._token_expired():
+            return token
+
+        with self._auth_lock:
+            # another thread might have refreshed the token while we waited
+            if self._token_expired():
+                token, token_metadata = authenticate(self._identity, self._name)
+                if not token or not token_metadata:
+                    raise ValueError("Failed to authenticate")
+                self._token_metadata = token_metadata
+                self._token = token
+
+            return self._token
+
+    def _invalidate_token(self, token: str):
+        with self._auth_lock:
+            # unless another thread has already replaced it
+            if self._token == token:
+                self._token = None
 
     def __repr__(self):
         return f"{self._delegate_address}  ({self._identity.public_key})"
@@ -83,26 +246,259 @@ class Client:
     def delegate_address(self) -> str:
         return self._delegate_address
 
+    @property
+    def last_rx_timestamp(self) -> datetime:
+        return self._last_rx_timestamp
+
+    @last_rx_timestamp.setter
+    def last_rx_timestamp(self, value: datetime):
+        with self._rx_lock:
+            self._last_rx_timestamp = value
+
     def send(self, target_address: str, message: str, msg_type: int = 1):
-        self._update_authentication()
+        """Send a message to the target.
+
+        With an outbox the envelope is only queued, and dispatched in the background.
+        The target key lookup (and the login it might need) is still synchronous,
+        but keys are cached so it only happens for targets not seen recently.
+        """
+        target_public_key = self._lookup_target(target_address)
+
+        content = _build_content(message, self._compression_threshold)
+        enc_envelope = self._build_envelope(target_public_key, content, msg_type)
+        self._dispatch([enc_envelope])
+
+    def send_chunked(
+        self,
+        target_address: str,
+        data: Union[bytes, BinaryIO],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        batch_size: int = DEFAULT_CHUNK_BATCH_SIZE,
+    ) -> str:
+        """Send a large payload (or a binary stream) as a sequence of chunk messages.
+
+        Only a single batch of envelopes is held in memory at any one time. The
+        returned transfer id can be used to reassemble the payload on the receiving
+        side with a ``ChunkAssembler``.
+        """
+        target_public_key = self._lookup_target(target_address)
+
+        transfer_id = new_transfer_id()
+        batch = []
+        for content in iter_chunk_contents(transfer_id, data, chunk_size):
+            batch.append(self._build_envelope(target_public_key, content, 1))
+            if len(batch) >= batch_size:
+                self._dispatch(batch)
+                batch = []
+
+        if batch:
+            self._dispatch(batch)
+
+        return transfer_id
+
+    def send_many(
+        self,
+        messages: Iterable[Tuple[str, str]],
+        batch_size: int = DEFAULT_SEND_BATCH_SIZE,
+        msg_type: int = 1,
+    ) -> Tuple[int, List[Tuple[str, str]]]:
+        """Send a stream of (target address, text) pairs in batches.
+
+        Dispatch is pipelined: the next batch is built and encrypted while the
+        previous one is in flight, the new targets of each batch are resolved with a
+        single bulk lookup. Messages to targets without a registered key are
+        skipped. Returns the number of messages sent and the unroutable messages, a
+        failure part way raises a ``SendError`` with both.
+        """
+        unroutable = []
+
+        def build_batches() -> Iterator[List[str]]:
+            for batch in _batched(messages, batch_size):
+                public_keys = self._lookup_targets(
+                    [target_address for target_address, _ in batch]
+                )
+
+                envelopes = []
+                for target_address, text in batch:
+                    target_public_key = public_keys[target_address]
+                    if target_public_key is None:
+                        unroutable.append((target_address, text))
+                        continue
+
+                    content = _build_content(text, self._compression_threshold)
+                    envelopes.append(
+                        self._build_envelope(target_public_key, content, msg_type)
+                    )
+
+                yield envelopes
+
+        try:
+            count = self._dispatch_pipelined(build_batches())
+        except SendError as err:
+            err.unroutable = unroutable
+            raise
+
+        return count, unroutable
+
+    def broadcast(
+        self,
+        target_addresses: Iterable[str],
+        message: str,
+        msg_type: int = 1,
+        batch_size: int = DEFAULT_SEND_BATCH_SIZE,
+        max_workers: int = DEFAULT_BROADCAST_WORKERS,
+    ) -> List[str]:
+        """Send the same message to many targets, returns the unroutable addresses.
+
+        Keys are resolved in bulk (or from the cache), the content and timestamps are
+        built once, and the per target envelopes are encrypted in parallel and
+        dispatched in batches. Both encrypted copies embed the target key, so they
+        are still built per target. A failure part way raises a ``SendError``.
+        """
+        # remove duplicates, keeping the order
+        target_addresses = list(dict.fromkeys(target_addresses))
+
+        public_keys = self._lookup_targets(target_addresses)
+        unroutable = [addr for addr in target_addresses if public_keys[addr] is None]
+        target_public_keys = [
+            public_keys[addr] for addr in target_addresses if public_keys[addr]
+        ]
+
+        content = _build_content(message, self._compression_threshold)
+        now = self._now().isoformat()
+
+        def build(target_public_key: str) -> str:
+            return self._build_envelope(target_public_key, content, msg_type, now)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            try:
+                self._dispatch_pipelined(
+                    list(executor.map(build, batch))
+                    for batch in _batched(target_public_keys, batch_size)
+                )
+            except SendError as err:
+                err.unroutable = unroutable
+                raise
+
+        return unroutable
+
+    def _dispatch_pipelined(self, batches: Iterable[List[str]]) -> int:
+        """Dispatch batches of envelopes, building the next while one is in flight.
+
+        Returns the number of envelopes sent, a failure raises a ``SendError`` with
+        the number sent before it.
+        """
+        count = 0
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                in_flight = None
+                for envelopes in batches:
+                    if not envelopes:
+                        continue
+
+                    # only keep a single dispatch in flight
+                    if in_flight is not None:
+                        count += in_flight.result()
+                    in_flight = executor.submit(self._dispatch_counted, envelopes)
+
+                if in_flight is not None:
+                    count += in_flight.result()
+        except Exception as err:
+            raise SendError(
+                f"Bulk send failed after {count} messages: {err}", count, []
+            ) from err
+
+        return count
+
+    def flush_outbox(self) -> int:
+        """Dispatch everything queued in the outbox now, returns the number sent."""
+        if self._outbox is None:
+            return 0
+        return self._outbox.flush(self._dispatch_now)
+
+    def close(self):
+        """Stop the background outbox flusher and drain the outbox."""
+        if self._outbox_flusher is not None:
+            self._outbox_flusher.stop()
+            self._outbox_flusher = None
+        self.flush_outbox()
+
+    def _dispatch(self, envelopes: List[str]):
+        if self._outbox is not None:
+            self._outbox.put_many(envelopes)
+        else:
+            self._dispatch_now(envelopes)
+
+    def _dispatch_counted(self, envelopes: List[str]) -> int:
+        self._dispatch(envelopes)
+        return len(envelopes)
+
+    def _dispatch_now(self, envelopes: List[str]):
+        # the token might expire during long transfers, refresh it per dispatch
+        token = self._update_authentication()
+        try:
+            dispatch_messages(token, envelopes)
+        except Exception as err:
+            if error_status(err) != 401:
+                raise
+
+            # the token was revoked (or the clocks disagree), log in again and retry
+            self._invalidate_token(token)
+            dispatch_messages(self._update_authentication(), envelopes)
+
+    def _cached_public_key(self, target_address: str) -> Optional[str]:
+        cached = self._public_keys.get(target_address)
+        if cached is not None and time.monotonic() - cached[1] < PUBLIC_KEY_CACHE_TTL:
+            return cached[0]
+        return None
+
+    def _lookup_targets(self, target_addresses: List[str]) -> Dict[str, Optional[str]]:
+        """Resolve many targets, looking up the ones not in the cache in bulk."""
+        public_keys = {addr: self._cached_public_key(addr) for addr in target_addresses}
+
+        missing = [addr for addr, key in public_keys.items() if key is None]
+        if missing:
+            found = lookup_messaging_public_keys(
+                self._update_authentication(), missing, self._chain_id
+            )
+            now = time.monotonic()
+            for addr, key in found.items():
+                public_keys[addr] = key
+                if key is not None:
+                    self._public_keys[addr] = (key, now)
+
+        return public_keys
+
+    def _lookup_target(self, target_address: str) -> str:
+        cached = self._cached_public_key(target_address)
+        if cached is not None:
+            return cached
 
         target_public_key = lookup_messaging_public_key(
-            self._token, target_address, self._chain_id
+            self._update_authentication(), target_address, self._chain_id
         )
         if target_public_key is None:
             raise RoutingError(f"Unable to route to {target_address}")
 
+        self._public_keys[target_address] = (target_public_key, time.monotonic())
+        return target_public_key
+
+    def _build_envelope(
+        self,
+        target_public_key: str,
+        content: Dict[str, Any],
+        msg_type: int,
+        now: Optional[str] = None,
+    ) -> str:
         # build up the message structure
-        now = self._now().isoformat()
+        now = now or self._now().isoformat()
         message = {
             "sender": self._identity.public_key,  # public key (hex)
             "target": target_public_key,  # public key (hex)
             "groupLastSeenTimestamp": now,
             "lastSeenTimestamp": now,
             "type": msg_type,  # 1 for text message, 2 for transaction data
-            "content": {
-                "text": message,
-            },
+            "content": content,
         }
 
         raw_message = to_json(message).encode()
@@ -132,62 +528,173 @@ class Client:
             "channelId": "MESSAGING",
         }
 
-        # encode and dispatch the envelope
-        enc_envelope = to_base64(to_json(envelope))
-        dispatch_messages(self._token, [enc_envelope])
+        # encode the envelope
+        return to_base64(to_json(envelope))
 
     def receive(self) -> List[Message]:
-        self._update_authentication()
+        return list(self.iter_receive())
 
-        output = []
+    def iter_receive(self) -> Iterator[Message]:
+        """Yield the new messages, as they are fetched and decrypted.
 
-        latest_rx_timestamp = self._last_rx_timestamp
+        Messages are received a batch at a time. The store and the receive cursor are
+        moved forward for each batch before it is yielded, so the client can be used
+        (or the cursor reset) from the loop body, and an abandoned iteration only
+        drops the remainder of its current batch. Concurrent receives still deliver
+        each message only once.
+        """
+        token = self._update_authentication()
+        for batch in self._iter_new_batches(token):
+            yield from batch
 
-        # attempt to decode the messages
-        for raw_message in list_messages(self._token):
-            if raw_message.target != self.delegate_address:
-                continue
-
-            # only retrieve new messages
-            if raw_message.sent_at <= self._last_rx_timestamp:
-                continue
-
-            latest_rx_timestamp = max(latest_rx_timestamp, raw_message.sent_at)
-
-            envelope = from_json(from_base64(raw_message.contents))
-            payload = from_json(from_base64(envelope["data"]))
-            encrypted_message = from_base64(payload["encryptedTargetData"])
-            message = from_json(self._identity.decrypt_message(encrypted_message))
+        # drop the received messages from the mailbox (not currently supported)
+        # drop_messages(token, received_msgs)
+
+    def receive_chunks(self, assembler: ChunkAssembler) -> List[Message]:
+        """Receive, feeding chunk messages straight into the assembler.
+
+        Chunks are written to the assembler's sink a batch at a time, so memory is
+        bounded by the batch rather than by the transfer size. Returns the messages
+        that are not part of the assembler's transfer.
+        """
+        others = []
+        for message in self.iter_receive():
+            if not assembler.add(message):
+                others.append(message)
+        return others
+
+    def _iter_new_batches(self, token: str) -> Iterator[List[Message]]:
+        if self._two_phase_fetch:
+            batches = self._iter_new_batches_two_phase(token)
+            try:
+                first = next(batches, None)
+            except UnsupportedQueryError:
+                # the server can't fetch contents by id, use the single query form
+                self._two_phase_fetch = False
+            else:
+                if first is not None:
+                    yield first
+                    yield from batches
+                return
+
+        yield self._receive_single_query(token)
+
+    def _iter_new_batches_two_phase(self, token: str) -> Iterator[List[Message]]:
+        # list the headers first, and only fetch the contents of the new messages
+        headers = sorted(
+            (h for h in iter_message_headers(token) if self._is_new(h)),
+            key=lambda h: h.sent_at,
+        )
 
-            output.append(
-                Message(
-                    id=raw_message.id,
-                    sender=raw_message.sender,
-                    target=raw_message.target,
-                    text=message["content"]["text"],
-                    sent_at=raw_message.sent_at,
-                    expires_at=raw_message.expires_at,
-                )
-            )
+        for batch in _batched(headers, CONTENTS_BATCH_SIZE):
+            with self._rx_lock:
+                # a concurrent receive might have delivered some of them already
+                batch = [h for h in batch if self._is_new(h)]
+                if not batch:
+                    continue
+
+                # the contents are streamed, one raw message is held at a time (the
+                # ones that expired in the meantime are missing from the response)
+                headers = {h.id: h for h in batch}
+                messages = []
+                for message_id, raw_contents in iter_message_contents(
+                    token, list(headers)
+                ):
+                    header = headers.pop(message_id, None)
+                    if header is None:
+                        continue
+
+                    raw_message = RawMessage(
+                        **header.model_dump(), contents=raw_contents
+                    )
+                    message = self._try_decode_message(raw_message)
+                    if message is not None:
+                        messages.append(message)
+                messages.sort(key=lambda m: m.sent_at)
+
+                self._commit(messages, batch[-1].sent_at)
+
+            yield messages
+
+    def _receive_single_query(self, token: str) -> List[Message]:
+        with self._rx_lock:
+            latest_rx_timestamp = self._last_rx_timestamp
+
+            # the response is read in full (releasing the connection) before any
+            # message is handed out
+            messages = []
+            for raw_message in iter_messages(token):
+                if not self._is_new(raw_message):
+                    continue
+
+                latest_rx_timestamp = max(latest_rx_timestamp, raw_message.sent_at)
+                message = self._try_decode_message(raw_message)
+                if message is not None:
+                    messages.append(message)
+
+            self._commit(messages, latest_rx_timestamp)
+
+        return messages
+
+    def _commit(self, messages: List[Message], latest_rx_timestamp: datetime):
+        # the history must be written before the cursor moves past the messages, a
+        # failed write leaves them to be delivered (and stored) again
+        if self._store is not None:
+            self._store.add_many(messages)
 
         # update the timestamp filter
-        self._last_rx_timestamp = latest_rx_timestamp
+        self._last_rx_timestamp = max(self._last_rx_timestamp, latest_rx_timestamp)
 
-        # drop the received messages from the mailbox (not currently supported)
-        # drop_messages(self._token, received_msgs)
+    def _is_new(self, header: MessageHeader) -> bool:
+        # only retrieve new messages for this delegate
+        return (
+            header.target == self.delegate_address
+            and header.sent_at > self._last_rx_timestamp
+        )
 
-        return output
+    def _try_decode_message(self, raw_message: RawMessage) -> Optional[Message]:
+        # messages come from any sender, a malformed one is skipped (and the cursor
+        # still moves past it) rather than failing every receive from now on
+        try:
+            return self._decode_message(raw_message)
+        except Exception:
+            logger.warning(
+                "Dropping undecodable message %s from %s",
+                raw_message.id,
+                raw_message.sender,
+                exc_info=True,
+            )
+            return None
+
+    def _decode_message(self, raw_message: RawMessage) -> Message:
+        envelope = from_json(from_base64(raw_message.contents))
+        payload = from_json(from_base64(envelope["data"]))
+        encrypted_message = from_base64(payload["encryptedTargetData"])
+        message = from_json(self._identity.decrypt_message(encrypted_message))
+
+        content = message["content"]
+        chunk = content.get("chunk")
+
+        return Message(
+            id=raw_message.id,
+            sender=raw_message.sender,
+            target=raw_message.target,
+            text=_extract_text(content),
+            sent_at=raw_message.sent_at,
+            expires_at=raw_message.expires_at,
+            chunk=ChunkInfo(**chunk) if chunk is not None else None,
+        )
 
-    def _update_registration(self):
+    def _update_registration(self, token: str):
         registered_pub_key = lookup_messaging_public_key(
-            self._token, self._delegate_address, self._chain_id
+            token, self._delegate_address, self._chain_id
         )
         if registered_pub_key != self._identity.public_key:
             print(
                 f"Registering {self._delegate_address} to {self._identity.address}..."
             )
             register_messaging_public_key(
-                self._token,
+                token,
                 self._delegate_address,
                 self._identity.public_key,
                 self._delegate_pubkey,
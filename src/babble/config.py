@@ -9,3 +9,57 @@ MEMORANDUM_SERVER = os.environ.get(
     "MEMORANDUM_SERVER",
     "https://messaging.fetch-ai.network",
 )
+
+# upper bound (in bytes) on the size of a decompressed message text, compressed
+# texts from other senders that expand beyond it are rejected
+MAX_DECOMPRESSED_SIZE = 16 * 1024 * 1024
+
+# chunked transfers (sizes are in bytes of raw payload data per message)
+DEFAULT_CHUNK_SIZE = 32 * 1024
+DEFAULT_CHUNK_BATCH_SIZE = 16
+DEFAULT_MAX_PENDING_CHUNKS = 64
+
+# upper bound on the concurrent client creations in Client.bootstrap_many
+DEFAULT_BOOTSTRAP_WORKERS = 32
+
+# read size (in bytes) when streaming mailbox responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# number of messages per dispatch request for bulk sends
+DEFAULT_SEND_BATCH_SIZE = 64
+
+# client side limits per operation type (requests per second, burst size and the
+# bounds of the adaptive concurrency limit), see babble.ratelimit. Logins and key
+# registrations are not rate limited, so the bootstrap fan-out is only cut back when
+# the server reports overload (429/5xx). Every bootstrapped client does a lookup, so
+# the lookup rate trades a higher peak load on the server for bootstrap time (about
+# 4s per 1000 clients at 200/s, after the burst)
+RATE_LIMITS = {
+    "auth": {"initial_concurrency": DEFAULT_BOOTSTRAP_WORKERS, "max_concurrency": 64},
+    "dispatch": {"rate": 50.0, "burst": 100, "latency_target": 10.0},
+    "lookup": {"rate": 200.0, "burst": 200, "latency_target": 10.0},
+    "register": {
+        "initial_concurrency": DEFAULT_BOOTSTRAP_WORKERS,
+        "max_concurrency": 64,
+        "latency_target": 10.0,
+    },
+    "mailbox": {"rate": 10.0, "burst": 20, "latency_target": 10.0},
+}
+
+# durable outbox (envelopes per dispatch request, and the flush timings in seconds)
+DEFAULT_OUTBOX_BATCH_SIZE = 100
+DEFAULT_OUTBOX_FLUSH_INTERVAL = 0.5
+DEFAULT_OUTBOX_MAX_BACKOFF = 60.0
+
+# failed dispatches of an envelope before it is moved to the outbox dead letters
+DEFAULT_OUTBOX_MAX_ATTEMPTS = 10
+
+# how long (in seconds) a client reuses a looked up target key
+PUBLIC_KEY_CACHE_TTL = 300
+
+# fan-out sends (addresses per bulk key lookup, and the parallel encryption workers)
+LOOKUP_BATCH_SIZE = 100
+DEFAULT_BROADCAST_WORKERS = 8
+
+# number of message contents requested per query in two-phase mailbox fetches
+CONTENTS_BATCH_SIZE = 50
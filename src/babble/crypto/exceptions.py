@@ -4,3 +4,20 @@ class ChitchatError(RuntimeError):
 
 class RoutingError(ChitchatError):
     pass
+
+
+class ChunkError(ChitchatError):
+    pass
+
+
+class UnsupportedQueryError(ChitchatError):
+    pass
+
+
+class SendError(ChitchatError):
+    """A bulk send failed part way, records how far it got."""
+
+    def __init__(self, message: str, sent: int, unroutable: list):
+        super().__init__(message)
+        self.sent = sent
+        self.unroutable = unroutable
@@ -1,7 +1,5 @@
 import hashlib
 
-from Crypto.Hash import RIPEMD160
-
 
 def sha256(contents: bytes) -> bytes:
     h = hashlib.sha256()
@@ -10,6 +8,13 @@ def sha256(contents: bytes) -> bytes:
 
 
 def ripemd160(contents: bytes) -> bytes:
-    h = RIPEMD160.new()
+    try:
+        h = hashlib.new("ripemd160")
+    except ValueError:
+        # not every OpenSSL build provides it, fall back to pycryptodome (which is
+        # slow to load, so only imported when needed)
+        from Crypto.Hash import RIPEMD160
+
+        h = RIPEMD160.new()
     h.update(contents)
     return h.digest()
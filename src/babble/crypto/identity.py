@@ -2,15 +2,18 @@ import base64
 import hashlib
 import json
 import os
-from typing import Tuple
+from functools import lru_cache
+from typing import Iterable, List, Tuple
 
 import bech32
 import ecdsa
 from ecdsa.util import sigencode_string_canonize
-from ecies import PrivateKey, decrypt, encrypt
 
 from .hashfuncs import ripemd160, sha256
 
+# default number of (heavyweight) signing key objects kept alive across identities
+SIGNING_KEY_CACHE_SIZE = 1024
+
 
 def _to_bech32(prefix: str, data: bytes) -> str:
     data_base5 = bech32.convertbits(data, 8, 5, True)
@@ -19,40 +22,105 @@ def _to_bech32(prefix: str, data: bytes) -> str:
     return bech32.bech32_encode(prefix, data_base5)
 
 
-def _compute_address(sk: ecdsa.SigningKey) -> Tuple[str, str]:
-    public_key = sk.get_verifying_key().to_string("compressed")
+def _compute_address(public_key: bytes) -> str:
     raw_address = ripemd160(sha256(public_key))
-    return _to_bech32("fetch", raw_address), public_key.hex()
+    return _to_bech32("fetch", raw_address)
+
+
+def _compute_public_key(secret: bytes) -> bytes:
+    return _compute_public_keys([secret])[0]
+
+
+def _compute_public_keys(secrets: List[bytes]) -> List[bytes]:
+    try:
+        from coincurve import PublicKey  # native, much faster than pure python
+    except ImportError:  # pragma: no cover
+        return [
+            _build_signing_key(secret).get_verifying_key().to_string("compressed")
+            for secret in secrets
+        ]
+
+    return [PublicKey.from_secret(secret).format(compressed=True) for secret in secrets]
+
+
+def _build_signing_key(secret: bytes) -> ecdsa.SigningKey:
+    return ecdsa.SigningKey.from_string(
+        secret, curve=ecdsa.SECP256k1, hashfunc=hashlib.sha256
+    )
+
+
+_signing_key = lru_cache(maxsize=SIGNING_KEY_CACHE_SIZE)(_build_signing_key)
+
+
+def clear_signing_key_cache():
+    """Drop the cached signing keys (and with them the private keys they hold)."""
+    _signing_key.cache_clear()
+
+
+def set_signing_key_cache_size(maxsize: int):
+    """Resize the shared signing key cache, a size of 0 disables the caching."""
+    global _signing_key
+    _signing_key.cache_clear()
+    _signing_key = lru_cache(maxsize=maxsize)(_build_signing_key)
 
 
 class Identity:
+    """A secp256k1 identity.
+
+    Only the raw secret and (once computed) the compressed public key and address are
+    stored, the signing key objects are built on demand and kept in a bounded, shared
+    cache (see ``clear_signing_key_cache`` and ``set_signing_key_cache_size``).
+    """
+
+    __slots__ = ("_secret", "_public_key", "_address")
+
     @staticmethod
     def from_seed(text: str) -> "Identity":
         private_key_bytes = sha256(sha256(text.encode()))
         return Identity(private_key_bytes)
 
+    @staticmethod
+    def from_seeds(texts: Iterable[str]) -> List["Identity"]:
+        """Create an identity per seed, deriving all of their public keys in one pass.
+
+        Unlike ``from_seed`` the public keys are derived up front (in a single batch
+        with the native backend), for callers that are going to use all of them.
+        """
+        identities = [Identity.from_seed(text) for text in texts]
+        public_keys = _compute_public_keys([i._secret for i in identities])
+        for identity, public_key in zip(identities, public_keys):
+            identity._public_key = public_key
+        return identities
+
     @staticmethod
     def generate() -> "Identity":
         return Identity(os.urandom(32))
 
     def __init__(self, private_key: bytes):
-        # build the keys
-        self._sk = ecdsa.SigningKey.from_string(
-            private_key, curve=ecdsa.SECP256k1, hashfunc=hashlib.sha256
-        )
-        self._msg_key = PrivateKey(private_key)
+        secret = bytes(private_key)
+        if (
+            len(secret) != 32
+            or not 0 < int.from_bytes(secret, "big") < ecdsa.SECP256k1.order
+        ):
+            raise ValueError("Invalid private key")
 
-        # compute the derived pieces of the identity
-        address, public_key = _compute_address(self._sk)
-        self._address = address
-        self._public_key = public_key
+        self._secret = secret
+        self._public_key = None  # compressed, derived on first use
+        self._address = None
 
     @property
     def address(self) -> str:
+        if self._address is None:
+            self._address = _compute_address(self._public_key_bytes())
         return self._address
 
     @property
     def public_key(self) -> str:
+        return self._public_key_bytes().hex()
+
+    def _public_key_bytes(self) -> bytes:
+        if self._public_key is None:
+            self._public_key = _compute_public_key(self._secret)
         return self._public_key
 
     def sign_arbitrary(self, data: bytes) -> Tuple[str, str]:
@@ -86,12 +154,17 @@ class Identity:
         return enc_sign_doc, signature
 
     def sign(self, data: bytes) -> str:
-        raw_signature = bytes(self._sk.sign(data, sigencode=sigencode_string_canonize))
+        sk = _signing_key(self._secret)
+        raw_signature = bytes(sk.sign(data, sigencode=sigencode_string_canonize))
         return base64.b64encode(raw_signature).decode()
 
     @staticmethod
     def encrypt_message(target: str, data: bytes) -> bytes:
+        from ecies import encrypt  # imported on first use, slow to load
+
         return encrypt(target, data)
 
     def decrypt_message(self, data: bytes) -> bytes:
-        return decrypt(self._msg_key.secret, data)
+        from ecies import decrypt  # imported on first use, slow to load
+
+        return decrypt(self._secret, data)
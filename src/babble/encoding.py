@@ -1,5 +1,6 @@
 import base64
 import json
+import zlib
 from typing import Any, Union
 
 
@@ -19,3 +20,20 @@ def to_base64(data: Union[bytes, str]) -> str:
 
 def from_base64(data: str) -> bytes:
     return base64.b64decode(data)
+
+
+def compress(data: Union[bytes, str]) -> bytes:
+    if isinstance(data, str):
+        data = data.encode()
+    return zlib.compress(data)
+
+
+def decompress(data: bytes, max_length: int) -> bytes:
+    """Decompress the data, raising a ValueError if it expands beyond max_length."""
+    decompressor = zlib.decompressobj()
+    output = decompressor.decompress(data, max_length + 1)
+    if len(output) > max_length:
+        raise ValueError(f"Decompressed data exceeds {max_length} bytes")
+    if not decompressor.eof:
+        raise ValueError("Truncated compressed data")
+    return output
@@ -1,30 +1,191 @@
+import codecs
+import json
+import re
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 from pydantic import BaseModel
 
-from .config import MEMORANDUM_SERVER
+from .config import (
+    DEFAULT_REQUEST_TIMEOUT,
+    LOOKUP_BATCH_SIZE,
+    MEMORANDUM_SERVER,
+    STREAM_CHUNK_SIZE,
+)
+from .crypto.exceptions import ChitchatError, UnsupportedQueryError
+from .encoding import from_json
+from .ratelimit import (
+    DISPATCH,
+    LOOKUP,
+    MAILBOX,
+    REGISTER,
+    get_limiter,
+    is_overload_status,
+)
+
+_MESSAGES_ARRAY_START = re.compile(r'"messages"\s*:\s*\[')
+_WHITESPACE = re.compile(r"[\s,]*")
+_VALIDATION_ERROR = re.compile(r"^(Unknown argument|Cannot query field)")
 
 
 def _from_js_date(value: int) -> datetime:
     return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
 
 
-def _execute(query: str, *, token: str, variables: Optional[Dict[str, Any]] = None):
+def _post(
+    query: str,
+    *,
+    token: str,
+    operation: str,
+    variables: Optional[Dict[str, Any]] = None,
+) -> requests.Response:
     payload = {"query": query, "variables": variables}
 
     # make the request
-    r = requests.post(
-        f"{MEMORANDUM_SERVER}/graphql",
-        json=payload,
-        headers={
-            "authorization": f"bearer {token}",
-        },
-    )
+    with get_limiter(operation).acquire() as slot:
+        r = requests.post(
+            f"{MEMORANDUM_SERVER}/graphql",
+            json=payload,
+            headers={
+                "authorization": f"bearer {token}",
+            },
+            timeout=DEFAULT_REQUEST_TIMEOUT,
+        )
+        slot.overloaded = is_overload_status(r.status_code)
+
+    r.raise_for_status()
+
+    return r
+
+
+@contextmanager
+def _stream(
+    query: str,
+    *,
+    token: str,
+    operation: str,
+    variables: Optional[Dict[str, Any]] = None,
+) -> Iterator[requests.Response]:
+    """Like ``_post`` but streamed, the slot is held until the response is closed."""
+    payload = {"query": query, "variables": variables}
+
+    with get_limiter(operation).acquire() as slot:
+        r = requests.post(
+            f"{MEMORANDUM_SERVER}/graphql",
+            json=payload,
+            headers={
+                "authorization": f"bearer {token}",
+            },
+            stream=True,
+            timeout=DEFAULT_REQUEST_TIMEOUT,
+        )
+        slot.overloaded = is_overload_status(r.status_code)
+
+        # the time spent reading the body depends on the consumer, only the time to
+        # the response headers is a measure of the server load
+        slot.latency = r.elapsed.total_seconds()
+
+        with r:
+            if r.ok:
+                yield r
+                return
+
     r.raise_for_status()
 
-    return r.json()
+
+def _execute(
+    query: str,
+    *,
+    token: str,
+    operation: str,
+    variables: Optional[Dict[str, Any]] = None,
+):
+    return _post(query, token=token, operation=operation, variables=variables).json()
+
+
+def _is_validation_error(error: Dict[str, Any]) -> bool:
+    """Whether a GraphQL error means the query is not supported by the schema."""
+    code = (error.get("extensions") or {}).get("code")
+    if code == "GRAPHQL_VALIDATION_FAILED":
+        return True
+    return _VALIDATION_ERROR.search(str(error.get("message", ""))) is not None
+
+
+def _raise_for_errors(resp: Dict[str, Any], action: str):
+    """Raise the errors of a GraphQL response (a 200 doesn't mean it succeeded).
+
+    Schema validation errors raise UnsupportedQueryError, anything else (e.g. a
+    transient server error) a ChitchatError.
+    """
+    errors = resp.get("errors") or []
+    if any(_is_validation_error(error) for error in errors):
+        raise UnsupportedQueryError(f"Unable to {action}: {errors}")
+    if errors or not resp.get("data"):
+        raise ChitchatError(f"Unable to {action}: {errors}")
+
+
+def _iter_messages_array(chunks: Iterator[bytes]) -> Iterator[Dict[str, Any]]:
+    """Incrementally parse the items of the `messages` array of a JSON response.
+
+    Only the current (partially received) item is buffered, so the memory use is
+    bounded by the largest single message rather than by the whole response. If
+    the response has no such array (e.g. a GraphQL error) it is parsed as a whole.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    buffer = ""
+    exhausted = False
+
+    def read_more() -> bool:
+        nonlocal buffer, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer += text_decoder.decode(b"", final=True)
+            return False
+        buffer += text_decoder.decode(chunk)
+        return True
+
+    # locate the start of the array
+    match = _MESSAGES_ARRAY_START.search(buffer)
+    while match is None:
+        if not read_more():
+            resp = from_json(buffer)
+            _raise_for_errors(resp, "query the mailbox")
+            yield from resp["data"]["mailbox"]["messages"]
+            return
+        match = _MESSAGES_ARRAY_START.search(buffer)
+
+    buffer = buffer[match.end() :]
+
+    while True:
+        pos = _WHITESPACE.match(buffer).end()
+        if pos == len(buffer):
+            if not read_more():
+                raise ValueError("Unexpected end of the messages array")
+            continue
+
+        if buffer[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+
+            # wait for (at least) twice as much data before trying again, to keep
+            # the re-parsing of very large items linear
+            target = 2 * len(buffer)
+            while len(buffer) < target and read_more():
+                pass
+            continue
+
+        buffer = buffer[end:]
+        yield item
 
 
 def lookup_messaging_public_key(
@@ -40,6 +201,7 @@ def lookup_messaging_public_key(
     """,
         variables={"address": address, "chainId": chain_id},
         token=token,
+        operation=LOOKUP,
     )
 
     data = resp["data"]["publicKey"]
@@ -49,6 +211,43 @@ def lookup_messaging_public_key(
     return data["publicKey"]
 
 
+def lookup_messaging_public_keys(
+    token: str, addresses: List[str], chain_id: str
+) -> Dict[str, Optional[str]]:
+    """Lookup the public keys of many addresses, batching them into aliased queries."""
+    public_keys = {}
+    for start in range(0, len(addresses), LOOKUP_BATCH_SIZE):
+        batch = addresses[start : start + LOOKUP_BATCH_SIZE]
+
+        params = "".join(f", $a{n}: String!" for n in range(len(batch)))
+        fields = "".join(
+            f"""
+      k{n}: publicKey(address: $a{n}, channelId: MESSAGING, chainId: $chainId) {{
+        publicKey
+      }}"""
+            for n in range(len(batch))
+        )
+
+        variables = {f"a{n}": address for n, address in enumerate(batch)}
+        variables["chainId"] = chain_id
+
+        resp = _execute(
+            f"""
+    query Query($chainId: String!{params}) {{{fields}
+    }}
+    """,
+            variables=variables,
+            token=token,
+            operation=LOOKUP,
+        )
+
+        for n, address in enumerate(batch):
+            data = resp["data"][f"k{n}"]
+            public_keys[address] = None if data is None else data["publicKey"]
+
+    return public_keys
+
+
 def register_messaging_public_key(
     token: str,
     address: str,
@@ -84,6 +283,7 @@ def register_messaging_public_key(
     """,
         variables=variables,
         token=token,
+        operation=REGISTER,
     )
 
 
@@ -97,7 +297,7 @@ def dispatch_messages(token: str, messages: List[str]):
         )
     }
 
-    _execute(
+    resp = _execute(
         """
     mutation Mutation($messages: [InputMessage!]!) {
       dispatchMessages(messages: $messages) {
@@ -112,21 +312,52 @@ def dispatch_messages(token: str, messages: List[str]):
     """,
         variables=variables,
         token=token,
+        operation=DISPATCH,
     )
 
+    # the server might reject the messages in the body of a successful response
+    _raise_for_errors(resp, "dispatch messages")
+
 
-class RawMessage(BaseModel):
+class MessageHeader(BaseModel):
     id: str
     group_id: str
     sender: str
     target: str
-    contents: str
     sent_at: datetime
     expires_at: datetime
 
 
-def list_messages(token: str) -> List[RawMessage]:
-    resp = _execute(
+class RawMessage(MessageHeader):
+    contents: str
+
+
+def _extract_header(data) -> MessageHeader:
+    return MessageHeader(
+        id=data["id"],
+        group_id=data["groupId"],
+        sender=data["sender"],
+        target=data["target"],
+        sent_at=_from_js_date(data["commitTimestamp"]),
+        expires_at=_from_js_date(data["expiryTimestamp"]),
+    )
+
+
+def _extract_message(data) -> RawMessage:
+    return RawMessage(
+        id=data["id"],
+        group_id=data["groupId"],
+        sender=data["sender"],
+        target=data["target"],
+        contents=data["contents"],
+        sent_at=_from_js_date(data["commitTimestamp"]),
+        expires_at=_from_js_date(data["expiryTimestamp"]),
+    )
+
+
+def iter_message_headers(token: str) -> Iterator[MessageHeader]:
+    """Stream the headers (everything except the contents) of the mailbox messages."""
+    with _stream(
         """
     query Messages {
       mailbox {
@@ -134,7 +365,6 @@ def list_messages(token: str) -> List[RawMessage]:
           id
           groupId
           expiryTimestamp
-          contents
           commitTimestamp
           sender
           target
@@ -143,27 +373,73 @@ def list_messages(token: str) -> List[RawMessage]:
     }
     """,
         token=token,
-    )
+        operation=MAILBOX,
+    ) as r:
+        chunks = r.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        for data in _iter_messages_array(chunks):
+            yield _extract_header(data)
 
-    def extract_message(data) -> RawMessage:
-        return RawMessage(
-            id=data["id"],
-            group_id=data["groupId"],
-            sender=data["sender"],
-            target=data["target"],
-            contents=data["contents"],
-            sent_at=_from_js_date(data["commitTimestamp"]),
-            expires_at=_from_js_date(data["expiryTimestamp"]),
-        )
 
-    messages = list(
-        map(
-            extract_message,
-            resp["data"]["mailbox"]["messages"],
-        )
-    )
+def iter_message_contents(token: str, ids: List[str]) -> Iterator[Tuple[str, str]]:
+    """Stream the (id, contents) of the given messages, parsing them one at a time.
 
-    return messages
+    Raises UnsupportedQueryError if the server can't select messages by id.
+    """
+    wanted = set(ids)
+    try:
+        with _stream(
+            """
+    query Messages($ids: [ID!]!) {
+      mailbox {
+        messages(ids: $ids) {
+          id
+          contents
+        }
+      }
+    }
+    """,
+            variables={"ids": ids},
+            token=token,
+            operation=MAILBOX,
+        ) as r:
+            chunks = r.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            for data in _iter_messages_array(chunks):
+                if data["id"] in wanted:
+                    yield data["id"], data["contents"]
+    except requests.HTTPError as err:
+        if err.response is not None and err.response.status_code == 400:
+            raise UnsupportedQueryError("Unable to fetch messages by id") from err
+        raise
+
+
+def iter_messages(token: str) -> Iterator[RawMessage]:
+    """Stream the messages of the mailbox, parsing them one at a time."""
+    with _stream(
+        """
+    query Messages {
+      mailbox {
+        messages {
+          id
+          groupId
+          expiryTimestamp
+          contents
+          commitTimestamp
+          sender
+          target
+        }
+      }
+    }
+    """,
+        token=token,
+        operation=MAILBOX,
+    ) as r:
+        chunks = r.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        for data in _iter_messages_array(chunks):
+            yield _extract_message(data)
+
+
+def list_messages(token: str) -> List[RawMessage]:
+    return list(iter_messages(token))
 
 
 def drop_messages(token: str, ids: List[str]):
@@ -185,4 +461,5 @@ def drop_messages(token: str, ids: List[str]):
     """,
         variables=variables,
         token=token,
+        operation=MAILBOX,
     )
@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+from .config import (
+    DEFAULT_OUTBOX_BATCH_SIZE,
+    DEFAULT_OUTBOX_FLUSH_INTERVAL,
+    DEFAULT_OUTBOX_MAX_ATTEMPTS,
+    DEFAULT_OUTBOX_MAX_BACKOFF,
+)
+from .ratelimit import error_status
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    envelope TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox_dead (
+    id INTEGER PRIMARY KEY,
+    envelope TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    error TEXT NOT NULL
+);
+"""
+
+DeadLetterCallback = Callable[[List[str], Exception], None]
+
+
+# the server refused the payload itself, retrying the same envelopes can't succeed
+_REJECTED_STATUSES = {400, 413, 422}
+
+# the credentials were refused, which says nothing about the envelopes
+_AUTH_STATUSES = {401, 403}
+
+
+class Outbox:
+    """A durable (SQLite backed) queue of encoded envelopes waiting to be dispatched.
+
+    Envelopes are only removed once their batch has been dispatched, so delivery is
+    at-least-once across failures and restarts. Envelopes the server rejects (400,
+    413 or 422), or that failed ``max_attempts`` times, are moved to a dead letter table (and
+    passed to ``on_dead_letter``) so they can't block the rest of the queue.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = DEFAULT_OUTBOX_BATCH_SIZE,
+        max_attempts: Optional[int] = DEFAULT_OUTBOX_MAX_ATTEMPTS,
+        on_dead_letter: Optional[DeadLetterCallback] = None,
+    ):
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._on_dead_letter = on_dead_letter
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time, avoids duplicates
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()
+        return count
+
+    def put(self, envelope: str):
+        self.put_many([envelope])
+
+    def put_many(self, envelopes: Iterable[str]):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO outbox (envelope, created_at) VALUES (?, ?)",
+                ((envelope, now) for envelope in envelopes),
+            )
+
+    def dead_letters(self) -> List[str]:
+        """The envelopes that were given up on, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT envelope FROM outbox_dead ORDER BY id"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def flush(self, dispatch: Callable[[List[str]], None]) -> int:
+        """Dispatch the queued envelopes in batches, returns the number sent.
+
+        Stops at the first batch failing with a transient error (which stays queued)
+        and re-raises its error. Rejected batches are split to isolate the offending
+        envelopes, the rest of the batch is still sent.
+        """
+        with self._flush_lock:
+            return self._flush(dispatch)
+
+    def _flush(self, dispatch: Callable[[List[str]], None]) -> int:
+        sent = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, envelope, attempts FROM outbox ORDER BY id LIMIT ?",
+                    (self._batch_size,),
+                ).fetchall()
+            if not rows:
+                return sent
+
+            sent += self._dispatch_rows(rows, dispatch)
+
+    def _dispatch_rows(
+        self, rows: List[tuple], dispatch: Callable[[List[str]], None]
+    ) -> int:
+        try:
+            dispatch([row[1] for row in rows])
+        except Exception as err:
+            status_code = error_status(err)
+            if status_code not in _REJECTED_STATUSES:
+                # a transient failure, auth failures don't use up the attempts
+                if status_code not in _AUTH_STATUSES:
+                    self._failed(rows, err)
+                raise
+
+            if len(rows) == 1:
+                # the server will never accept this envelope
+                self._dead_letter(rows, err)
+                return 0
+
+            # bisect the batch to isolate the rejected envelopes
+            middle = len(rows) // 2
+            return self._dispatch_rows(rows[:middle], dispatch) + self._dispatch_rows(
+                rows[middle:], dispatch
+            )
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM outbox WHERE id = ?", [(row[0],) for row in rows]
+            )
+        return len(rows)
+
+    def _failed(self, rows: List[tuple], err: Exception):
+        # give up on the envelopes that have used up their attempts
+        exhausted = [
+            row
+            for row in rows
+            if self._max_attempts is not None and row[2] + 1 >= self._max_attempts
+        ]
+        retried = [(row[0],) for row in rows if row not in exhausted]
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", retried
+            )
+
+        if exhausted:
+            self._dead_letter(exhausted, err)
+
+    def _dead_letter(self, rows: List[tuple], err: Exception):
+        ids = [(row[0],) for row in rows]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO outbox_dead (id, envelope, attempts, created_at, error) "
+                "SELECT id, envelope, attempts + 1, created_at, ? FROM outbox "
+                "WHERE id = ?",
+                [(repr(err), id_) for (id_,) in ids],
+            )
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", ids)
+
+        if self._on_dead_letter is not None:
+            self._on_dead_letter([row[1] for row in rows], err)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class OutboxFlusher:
+    """Background thread that periodically drains an outbox, backing off on errors."""
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        dispatch: Callable[[List[str]], None],
+        interval: float = DEFAULT_OUTBOX_FLUSH_INTERVAL,
+        max_backoff: float = DEFAULT_OUTBOX_MAX_BACKOFF,
+    ):
+        self._outbox = outbox
+        self._dispatch = dispatch
+        self._interval = interval
+        self._max_backoff = max_backoff
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[Exception] = None
+
+    def start(self) -> "OutboxFlusher":
+        self._thread = threading.Thread(
+            target=self._run, name="babble-outbox-flusher", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        delay = self._interval
+        while not self._stop.wait(delay):
+            try:
+                self._outbox.flush(self._dispatch)
+            except Exception as err:
+                # the failed batch stays queued, retry with exponential back off
+                self.last_error = err
+                delay = min(self._max_backoff, max(delay, self._interval) * 2)
+            else:
+                self.last_error = None
+                delay = self._interval
@@ -0,0 +1,175 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from .config import RATE_LIMITS
+
+# operation types, each of them is limited independently
+AUTH = "auth"
+DISPATCH = "dispatch"
+LOOKUP = "lookup"
+MAILBOX = "mailbox"
+REGISTER = "register"
+
+
+def is_overload_status(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def error_status(err: BaseException) -> Optional[int]:
+    """The HTTP status code of a failed request's error, if it has one."""
+    return getattr(getattr(err, "response", None), "status_code", None)
+
+
+class TokenBucket:
+    """A thread-safe token bucket, a rate of None disables the limit."""
+
+    def __init__(self, rate: Optional[float], burst: float):
+        self._rate = rate
+        self._burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self._rate is None:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._burst, self._tokens + (now - self._updated) * self._rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+
+                delay = (1.0 - self._tokens) / self._rate
+
+            time.sleep(delay)
+
+
+class Slot:
+    """A granted request slot, mark it as overloaded to signal back pressure.
+
+    The latency defaults to the time the slot was held, it can be set explicitly
+    when the slot is held for longer than the request itself (e.g. streaming).
+    """
+
+    def __init__(self, saturated: bool = False):
+        self.overloaded = False
+        self.latency: Optional[float] = None
+        self.saturated = saturated  # taken at (or one below) the concurrency limit
+
+
+class AdaptiveLimiter:
+    """Rate limiter with an AIMD controlled concurrency limit.
+
+    Requests first take a token from the bucket and then wait for a free slot. The
+    number of slots grows additively (by about one per limit's worth of successful
+    requests, counting only the ones that ran with the limit nearly used up, so light
+    traffic does not inflate it) and is cut multiplicatively when the server reports overload (429/5xx),
+    the request fails, or the latency exceeds the target.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: float = 1,
+        initial_concurrency: float = 4,
+        min_concurrency: float = 1,
+        max_concurrency: float = 64,
+        latency_target: Optional[float] = None,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 1.0,
+    ):
+        self._bucket = TokenBucket(rate, burst)
+        self._limit = float(initial_concurrency)
+        self._min_concurrency = float(min_concurrency)
+        self._max_concurrency = float(max_concurrency)
+        self._latency_target = latency_target
+        self._decrease_factor = decrease_factor
+        self._decrease_cooldown = decrease_cooldown
+
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> float:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @contextmanager
+    def acquire(self) -> Iterator[Slot]:
+        self._bucket.acquire()
+
+        with self._cond:
+            while self._in_flight >= max(int(self._limit), 1):
+                self._cond.wait()
+            self._in_flight += 1
+            slot = Slot(saturated=self._in_flight >= self._limit - 1)
+
+        started = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            slot.overloaded = True
+            raise
+        finally:
+            latency = slot.latency
+            if latency is None:
+                latency = time.monotonic() - started
+            self._release(slot, latency)
+
+    def _release(self, slot: Slot, latency: float):
+        with self._cond:
+            self._in_flight -= 1
+
+            slow = self._latency_target is not None and latency > self._latency_target
+            if slot.overloaded or slow:
+                self._decrease()
+            elif slot.saturated:
+                self._limit = min(self._max_concurrency, self._limit + 1 / self._limit)
+
+            self._cond.notify_all()
+
+    def _decrease(self):
+        # a burst of failures from the same window should only back off once
+        now = time.monotonic()
+        if now - self._last_decrease < self._decrease_cooldown:
+            return
+
+        self._last_decrease = now
+        self._limit = max(self._min_concurrency, self._limit * self._decrease_factor)
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(operation: str) -> AdaptiveLimiter:
+    """Get the (process wide) limiter shared by all requests of an operation type."""
+    limiter = _limiters.get(operation)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        if operation not in _limiters:
+            _limiters[operation] = AdaptiveLimiter(**RATE_LIMITS.get(operation, {}))
+        return _limiters[operation]
+
+
+def configure_limiter(operation: str, **kwargs) -> AdaptiveLimiter:
+    """Replace the limiter of an operation type, see ``AdaptiveLimiter`` for options."""
+    limiter = AdaptiveLimiter(**kwargs)
+    with _limiters_lock:
+        _limiters[operation] = limiter
+    return limiter
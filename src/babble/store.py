@@ -0,0 +1,178 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from .chunking import ChunkInfo
+from .client import Message
+from .encoding import from_json, to_json
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    sender TEXT NOT NULL,
+    target TEXT NOT NULL,
+    text TEXT NOT NULL,
+    sent_at INTEGER NOT NULL,
+    expires_at INTEGER NOT NULL,
+    chunk TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_sender ON messages (sender, sent_at);
+CREATE INDEX IF NOT EXISTS messages_target ON messages (target, sent_at);
+CREATE INDEX IF NOT EXISTS messages_sent_at ON messages (sent_at);
+CREATE INDEX IF NOT EXISTS messages_expires_at ON messages (expires_at);
+"""
+
+_COLUMNS = "id, sender, target, text, sent_at, expires_at, chunk"
+
+
+def _to_micros(value: datetime) -> int:
+    if value.tzinfo is None:
+        raise ValueError(f"Expected a timezone aware datetime, got {value}")
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _to_row(message: Message) -> tuple:
+    return (
+        message.id,
+        message.sender,
+        message.target,
+        message.text,
+        _to_micros(message.sent_at),
+        _to_micros(message.expires_at),
+        to_json(message.chunk.model_dump()) if message.chunk is not None else None,
+    )
+
+
+def _from_row(row: tuple) -> Message:
+    id_, sender, target, text, sent_at, expires_at, chunk = row
+    return Message(
+        id=id_,
+        sender=sender,
+        target=target,
+        text=text,
+        sent_at=_from_micros(sent_at),
+        expires_at=_from_micros(expires_at),
+        chunk=ChunkInfo(**from_json(chunk)) if chunk is not None else None,
+    )
+
+
+class MessageStore:
+    """A local (SQLite backed) history of the decrypted messages.
+
+    Messages are indexed by sender, target and sent time. The history is pruned on
+    every write: if ``max_messages`` is set the oldest messages are dropped to stay
+    within that size and, unless ``retain_expired`` is set, the messages past their
+    (mailbox) expiry time are dropped too.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_messages: Optional[int] = None,
+        retain_expired: bool = True,
+    ):
+        self._max_messages = max_messages
+        self._retain_expired = retain_expired
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        return count
+
+    def add_many(self, messages: Iterable[Message]):
+        """Store a batch of messages (in a single transaction), ignoring duplicates."""
+        rows = [_to_row(message) for message in messages]
+        if not rows:
+            return
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO messages ({_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._prune()
+
+    def get(self, message_id: str) -> Optional[Message]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+        return _from_row(row) if row is not None else None
+
+    def query(
+        self,
+        sender: Optional[str] = None,
+        target: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> List[Message]:
+        """Query the stored messages, ordered by the time they were sent.
+
+        The ``since`` bound is exclusive and the ``until`` bound is inclusive, both
+        must be timezone aware.
+        """
+        conditions = []
+        params = []
+        if sender is not None:
+            conditions.append("sender = ?")
+            params.append(sender)
+        if target is not None:
+            conditions.append("target = ?")
+            params.append(target)
+        if since is not None:
+            conditions.append("sent_at > ?")
+            params.append(_to_micros(since))
+        if until is not None:
+            conditions.append("sent_at <= ?")
+            params.append(_to_micros(until))
+
+        sql = f"SELECT {_COLUMNS} FROM messages"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY sent_at, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def prune(self):
+        """Apply the retention policy, see ``MessageStore``."""
+        with self._lock, self._conn:
+            self._prune()
+
+    def _prune(self):
+        if not self._retain_expired:
+            now = _to_micros(datetime.now(timezone.utc))
+            self._conn.execute("DELETE FROM messages WHERE expires_at <= ?", (now,))
+
+        if self._max_messages is not None:
+            self._conn.execute(
+                "DELETE FROM messages WHERE id IN ("
+                "SELECT id FROM messages ORDER BY sent_at DESC, id DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self._max_messages,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,113 @@
+import base64
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import babble.client
+import pytest
+from babble import Client, Identity
+from babble.auth import TokenMetadata
+from babble.config import TESTNET_CHAIN_ID
+from babble.encoding import from_base64, from_json
+from babble.crypto.exceptions import UnsupportedQueryError
+from babble.mailbox import MessageHeader, RawMessage
+
+
+class FakeMemorandum:
+    """In-memory stand-in for the auth and messaging servers."""
+
+    def __init__(self):
+        self.public_keys = {}
+        self.messages = []
+        self.dispatches = []
+        self.fetched_contents = []
+        self.supports_fetch_by_id = True
+        self._counter = itertools.count()
+
+    def authenticate(self, identity, name=None):
+        now = datetime.now(timezone.utc)
+        metadata = TokenMetadata(
+            address=identity.address,
+            public_key=identity.public_key,
+            issued_at=now,
+            expires_at=now + timedelta(hours=1),
+        )
+        return f"token-{identity.address}", metadata
+
+    def lookup_messaging_public_key(self, token, address, chain_id):
+        return self.public_keys.get(address)
+
+    def lookup_messaging_public_keys(self, token, addresses, chain_id):
+        return {address: self.public_keys.get(address) for address in addresses}
+
+    def register_messaging_public_key(self, token, address, public_key, *args):
+        self.public_keys[address] = public_key
+
+    def _address_of(self, public_key):
+        for address, key in self.public_keys.items():
+            if key == public_key:
+                return address
+        raise KeyError(public_key)
+
+    def dispatch_messages(self, token, messages):
+        self.dispatches.append(len(messages))
+        for contents in messages:
+            envelope = from_json(from_base64(contents))
+            n = next(self._counter)
+            sent_at = datetime.now(timezone.utc) + timedelta(microseconds=n)
+            self.messages.append(
+                RawMessage(
+                    id=str(n),
+                    group_id="",
+                    sender=self._address_of(envelope["senderPublicKey"]),
+                    target=self._address_of(envelope["targetPublicKey"]),
+                    contents=contents,
+                    sent_at=sent_at,
+                    expires_at=sent_at + timedelta(days=1),
+                )
+            )
+
+    def iter_messages(self, token):
+        return iter(list(self.messages))
+
+    def iter_message_headers(self, token):
+        return iter([MessageHeader(**msg.model_dump()) for msg in self.messages])
+
+    def iter_message_contents(self, token, ids):
+        if not self.supports_fetch_by_id:
+            raise UnsupportedQueryError("Unable to fetch messages by id")
+        self.fetched_contents.extend(ids)
+        return iter([(msg.id, msg.contents) for msg in self.messages if msg.id in ids])
+
+    def client(self, seed: str, **kwargs) -> Client:
+        delegate_identity = Identity.from_seed(seed)
+        identity = Identity.from_seed(f"{seed} {TESTNET_CHAIN_ID}")
+        signed_bytes, signature = delegate_identity.sign_arbitrary(
+            identity.public_key.encode()
+        )
+
+        return Client(
+            delegate_identity.address,
+            base64.b64encode(bytes.fromhex(delegate_identity.public_key)).decode(),
+            signature,
+            signed_bytes,
+            identity,
+            TESTNET_CHAIN_ID,
+            **kwargs,
+        )
+
+
+@pytest.fixture
+def memorandum(monkeypatch) -> FakeMemorandum:
+    fake = FakeMemorandum()
+    for name in (
+        "authenticate",
+        "lookup_messaging_public_key",
+        "lookup_messaging_public_keys",
+        "register_messaging_public_key",
+        "dispatch_messages",
+        "iter_messages",
+        "iter_message_headers",
+        "iter_message_contents",
+    ):
+        monkeypatch.setattr(babble.client, name, getattr(fake, name))
+    return fake
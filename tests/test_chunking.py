@@ -0,0 +1,76 @@
+import io
+import os
+import random
+from datetime import datetime, timezone
+
+import pytest
+from babble import ChunkAssembler, Message
+from babble.chunking import ChunkInfo, iter_chunk_contents
+from babble.crypto.exceptions import ChunkError
+
+
+def to_messages(contents):
+    now = datetime.now(timezone.utc)
+    return [
+        Message(
+            id=str(n),
+            sender="sender",
+            target="target",
+            text=content["text"],
+            sent_at=now,
+            expires_at=now,
+            chunk=ChunkInfo(**content["chunk"]),
+        )
+        for n, content in enumerate(contents)
+    ]
+
+
+def test_chunked_roundtrip_out_of_order():
+    payload = os.urandom(10_000)
+    messages = to_messages(iter_chunk_contents("abc", io.BytesIO(payload), 1024))
+    assert len(messages) == 10
+    assert messages[-1].chunk.final
+
+    random.Random(42).shuffle(messages)
+
+    sink = io.BytesIO()
+    assembler = ChunkAssembler(sink)
+    for message in messages:
+        assert assembler.add(message)
+        assert assembler.add(message)  # duplicates are ignored
+
+    assert assembler.complete
+    assert assembler.transfer_id == "abc"
+    assert sink.getvalue() == payload
+
+
+def test_chunked_empty_payload():
+    messages = to_messages(iter_chunk_contents("abc", b"", 1024))
+    assert len(messages) == 1
+
+    sink = io.BytesIO()
+    assembler = ChunkAssembler(sink, "abc")
+    assert assembler.add(messages[0])
+    assert assembler.complete
+    assert sink.getvalue() == b""
+
+
+def test_chunked_bounds_and_integrity():
+    messages = to_messages(iter_chunk_contents("abc", os.urandom(4096), 512))
+
+    # other transfers are not consumed
+    assert not ChunkAssembler(io.BytesIO(), "other").add(messages[0])
+
+    # the out of order buffer is bounded
+    assembler = ChunkAssembler(io.BytesIO(), max_pending=2)
+    assembler.add(messages[3])
+    assembler.add(messages[2])
+    with pytest.raises(ChunkError):
+        assembler.add(messages[1])
+
+    # tampered payloads are detected
+    messages[-1].chunk.digest = "00" * 32
+    assembler = ChunkAssembler(io.BytesIO())
+    with pytest.raises(ChunkError):
+        for message in messages:
+            assembler.add(message)
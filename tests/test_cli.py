@@ -0,0 +1,104 @@
+import io
+from datetime import datetime, timezone
+
+import babble.client
+import pytest
+from babble.cli import _load_cursor, _read_records, _save_cursor, main
+
+
+def test_read_records():
+    stream = io.StringIO(
+        '{"target": "a", "text": "hello"}\n\n{"target": "b", "text": 1}\n'
+    )
+    assert list(_read_records(stream)) == [("a", "hello"), ("b", "1")]
+
+    with pytest.raises(ValueError):
+        list(_read_records(io.StringIO('{"text": "no target"}\n')))
+
+
+def test_cursor_roundtrip(tmp_path):
+    path = str(tmp_path / "cursor")
+    assert _load_cursor(path) is None
+
+    now = datetime.now(timezone.utc)
+    _save_cursor(path, now)
+    assert _load_cursor(path) == now
+
+
+def test_send_and_tail(memorandum, monkeypatch, capsys, tmp_path):
+    receiver = memorandum.client("the name of the wind")
+
+    # start tailing from before the messages are sent
+    cursor = str(tmp_path / "cursor")
+    _save_cursor(cursor, receiver.last_rx_timestamp)
+
+    records = "".join(
+        f'{{"target": "{receiver.delegate_address}", "text": "msg {n}"}}\n'
+        for n in range(3)
+    )
+    monkeypatch.setattr("sys.stdin", io.StringIO(records))
+    assert main(["--seed", "the wise mans fear", "--chain-id", "dorado-1", "send"]) == 0
+
+    capsys.readouterr()
+
+    tail = ["--seed", "the name of the wind", "--chain-id", "dorado-1", "tail"]
+    assert main(tail + ["--once", "--cursor", cursor]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3 and '"text":"msg 2"' in lines[-1]
+
+    # a restarted tail resumes from the persisted cursor
+    assert main(tail + ["--once", "--cursor", cursor]) == 0
+    assert capsys.readouterr().out == ""
+
+
+def test_send_unroutable(memorandum, monkeypatch, capsys):
+    receiver = memorandum.client("the name of the wind")
+
+    records = (
+        '{"target": "unknown", "text": "lost"}\n'
+        f'{{"target": "{receiver.delegate_address}", "text": "hello"}}\n'
+    )
+    monkeypatch.setattr("sys.stdin", io.StringIO(records))
+    assert main(["--seed", "the wise mans fear", "--chain-id", "dorado-1", "send"]) == 1
+
+    err = capsys.readouterr().err
+    assert '{"target":"unknown","text":"lost"}' in err
+    assert "Sent 1 messages, 1 unroutable" in err
+    assert [msg.text for msg in receiver.receive()] == ["hello"]
+
+
+def test_send_malformed_line(memorandum, monkeypatch, capsys):
+    receiver = memorandum.client("the name of the wind")
+
+    # the records before the malformed line are still sent
+    records = (
+        f'{{"target": "{receiver.delegate_address}", "text": "hello"}}\nnot json\n'
+    )
+    monkeypatch.setattr("sys.stdin", io.StringIO(records))
+    assert main(["--seed", "the wise mans fear", "--chain-id", "dorado-1", "send"]) == 1
+
+    err = capsys.readouterr().err
+    assert "Sent 1 messages, 0 unroutable" in err
+    assert "Line 2: invalid JSON" in err
+    assert [msg.text for msg in receiver.receive()] == ["hello"]
+
+
+def test_tail_retries(memorandum, monkeypatch, capsys):
+    sleeps = []
+    monkeypatch.setattr("babble.cli.time.sleep", sleeps.append)
+
+    def flaky(token):
+        if len(sleeps) < 2:
+            raise ConnectionError("server blip")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(babble.client, "iter_message_headers", flaky)
+
+    tail = ["--seed", "the name of the wind", "--chain-id", "dorado-1", "tail"]
+    assert main(tail + ["--interval", "1"]) == 130
+    assert sleeps == [2.0, 4.0]
+    assert capsys.readouterr().err.count("server blip") == 2
+
+    # a single poll reports the failure
+    sleeps.clear()
+    assert main(tail + ["--once"]) == 1
@@ -1,8 +1,24 @@
 import base64
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
 import pytest
-from babble import Client, Identity
+from babble import ChunkAssembler, Client, Identity
+from babble.client import _build_content, _extract_text
 from babble.config import MAINNET_CHAIN_ID, TESTNET_CHAIN_ID
+from babble.crypto.exceptions import (
+    ChitchatError,
+    SendError,
+    UnsupportedQueryError,
+)
+from babble.encoding import compress, to_base64
+from babble.mailbox import _iter_messages_array
 
 
 def create_client(seed: str, chain_id: str) -> Client:
@@ -59,3 +75,372 @@ def test_message_handling():
     # ensure user2 can't decrypt their own message
     with pytest.raises(ValueError):
         user2.decrypt_message(data)
+
+
+def test_content_compression():
+    text = "All the truth in the world is held in stories. " * 100
+
+    # small or disabled payloads keep the plain format for older clients
+    assert _build_content(text, None) == {"text": text}
+    assert _build_content("short", 16) == {"text": "short"}
+
+    content = _build_content(text, 16)
+    assert content["compression"] == "zlib"
+    assert len(content["text"]) < len(text)
+    assert _extract_text(content) == text
+    assert _extract_text({"text": text}) == text
+
+    # the expansion of compressed texts (from untrusted senders) is bounded
+    bomb = {"text": to_base64(compress(bytes(20_000_000))), "compression": "zlib"}
+    with pytest.raises(ValueError):
+        _extract_text(bomb)
+
+
+def test_undecodable_messages_are_skipped(memorandum):
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind")
+
+    target_public_key = client1._lookup_target(client2.delegate_address)
+    for content in (
+        {"text": "x", "compression": "gzip"},
+        {"text": "x", "chunk": {"id": "broken"}},
+    ):
+        envelope = client1._build_envelope(target_public_key, content, 1)
+        client1._dispatch([envelope])
+    client1.send(client2.delegate_address, "hello")
+
+    assert [msg.text for msg in client2.receive()] == ["hello"]
+    assert client2.receive() == []
+
+
+def test_bootstrap_many(monkeypatch):
+    import babble.client
+
+    registered = {}
+
+    def authenticate(identity, name=None):
+        if name == "broken":
+            return None, None
+        return "token", SimpleNamespace(expires_at=datetime.now(timezone.utc))
+
+    def lookup(token, address, chain_id):
+        return registered.get(address)
+
+    def register(token, address, public_key, *args):
+        registered[address] = public_key
+
+    monkeypatch.setattr(babble.client, "authenticate", authenticate)
+    monkeypatch.setattr(babble.client, "lookup_messaging_public_key", lookup)
+    monkeypatch.setattr(babble.client, "register_messaging_public_key", register)
+
+    specs = []
+    for n in range(8):
+        identity = Identity.from_seed(f"bootstrap {n}")
+        specs.append(
+            {
+                "delegate_address": identity.address,
+                "delegate_pubkey": identity.public_key,
+                "signature": "",
+                "signed_obj_base64": "",
+                "identity": identity,
+                "chain_id": TESTNET_CHAIN_ID,
+                "name": "broken" if n == 3 else None,
+            }
+        )
+
+    results = Client.bootstrap_many(specs, max_workers=4)
+
+    assert len(results) == len(specs)
+    assert isinstance(results[3], ValueError)
+    for n, (spec, result) in enumerate(zip(specs, results)):
+        if n != 3:
+            assert result.delegate_address == spec["delegate_address"]
+    assert len(registered) == 7
+
+
+def test_bootstrap_many_auth_limiter(memorandum, monkeypatch):
+    import babble.auth
+    import babble.client
+    import babble.ratelimit
+    import jwt
+    from babble.config import RATE_LIMITS
+    from babble.ratelimit import AUTH, AdaptiveLimiter
+
+    # run the real logins through a fresh (default configured) auth limiter
+    limiter = AdaptiveLimiter(**RATE_LIMITS[AUTH])
+    monkeypatch.setitem(babble.ratelimit._limiters, AUTH, limiter)
+    monkeypatch.setattr(babble.client, "authenticate", babble.auth.authenticate)
+
+    identities = {}
+    peak = 0
+    lock = threading.Lock()
+
+    def post(url, json, **kwargs):
+        nonlocal peak
+        with lock:
+            peak = max(peak, limiter.in_flight)
+        time.sleep(0.02)
+
+        if url.endswith("/challenge"):
+            body = {"challenge": "challenge", "nonce": "nonce"}
+        elif url.endswith("/verify"):
+            body = {"address": json["address"]}
+        else:
+            identity = identities[json["address"]]
+            now = int(time.time())
+            claims = {
+                "pk": base64.b64encode(bytes.fromhex(identity.public_key)).decode(),
+                "iat": now,
+                "exp": now + 3600,
+                "iss": "fetch.ai",
+            }
+            body = {"access_token": jwt.encode(claims, "secret" * 8)}
+        return SimpleNamespace(status_code=200, json=lambda: body)
+
+    monkeypatch.setattr(babble.auth.requests, "post", post)
+
+    specs = []
+    for n in range(32):
+        identity = Identity.from_seed(f"bootstrap {n}")
+        identities[identity.address] = identity
+        specs.append(
+            {
+                "delegate_address": identity.address,
+                "delegate_pubkey": identity.public_key,
+                "signature": "",
+                "signed_obj_base64": "",
+                "identity": identity,
+                "chain_id": TESTNET_CHAIN_ID,
+            }
+        )
+
+    start = time.monotonic()
+    results = Client.bootstrap_many(specs)
+    elapsed = time.monotonic() - start
+
+    assert all(isinstance(result, Client) for result in results)
+
+    # the 96 logins run in parallel, rather than trickling through a rate limit
+    assert peak > 8
+    assert elapsed < 2.0
+
+
+def test_streaming_mailbox_parsing():
+    messages = [
+        {"id": str(n), "contents": "xé日本" * n * 250, "note": 'quoted "]}" 日本'}
+        for n in range(20)
+    ]
+    body = json.dumps(
+        {"data": {"mailbox": {"messages": messages}}}, ensure_ascii=False
+    ).encode()
+    assert len(body) > len(body.decode())  # the body has multi-byte sequences
+
+    # feed the response in small chunks (splitting multi-byte sequences too)
+    for chunk_size in (1, 7, 4096, len(body)):
+        chunks = (body[i : i + chunk_size] for i in range(0, len(body), chunk_size))
+        assert list(_iter_messages_array(chunks)) == messages
+
+    # responses without the array are parsed as a whole
+    body = json.dumps({"data": {"mailbox": {"messages": []}}, "x": "é"}).encode()
+    assert list(_iter_messages_array(iter([body]))) == []
+
+
+def test_send_many(memorandum, monkeypatch):
+    import babble.client
+
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind")
+
+    lookups = []
+
+    def lookup(token, addresses, chain_id):
+        lookups.append(list(addresses))
+        return memorandum.lookup_messaging_public_keys(token, addresses, chain_id)
+
+    monkeypatch.setattr(babble.client, "lookup_messaging_public_keys", lookup)
+
+    texts = [f"message {n}" for n in range(10)]
+    records = [(client2.delegate_address, text) for text in texts]
+    unknown = Identity.from_seed("unknown").address
+    records.insert(5, (unknown, "lost"))
+
+    # unroutable messages are skipped and reported
+    count, unroutable = client1.send_many(records, batch_size=4)
+
+    assert count == 10
+    assert unroutable == [(unknown, "lost")]
+    assert memorandum.dispatches == [4, 3, 3]
+    assert [msg.text for msg in client2.receive()] == texts
+    assert client2.receive() == []
+
+    # new targets are looked up in bulk per batch, known ones come from the cache
+    assert lookups == [[client2.delegate_address], [unknown]]
+
+    # a failure part way reports the progress
+    def failing(token, messages):
+        raise ConnectionError("server down")
+
+    monkeypatch.setattr(babble.client, "dispatch_messages", failing)
+    with pytest.raises(SendError) as err:
+        client1.send_many(records, batch_size=4)
+    assert err.value.sent == 0
+
+
+def test_thread_safe_client(memorandum, monkeypatch):
+    import babble.client
+
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind")
+
+    logins = []
+
+    def slow_authenticate(identity, name=None):
+        logins.append(identity.address)
+        time.sleep(0.1)
+        return memorandum.authenticate(identity, name)
+
+    monkeypatch.setattr(babble.client, "authenticate", slow_authenticate)
+
+    # force a token refresh, it must only happen once for all the threads
+    client1._token_metadata.expires_at = datetime.now(timezone.utc)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for n in range(32):
+            executor.submit(client1.send, client2.delegate_address, f"msg {n}")
+
+    assert len(logins) == 1
+    assert len(memorandum.messages) == 32
+
+    # concurrent receives deliver each message exactly once
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: client2.receive(), range(8)))
+
+    texts = [msg.text for result in results for msg in result]
+    assert sorted(texts) == sorted(f"msg {n}" for n in range(32))
+
+
+def test_broadcast(memorandum, monkeypatch):
+    import babble.client
+
+    sender = memorandum.client("the wise mans fear")
+    receivers = [memorandum.client(f"receiver {n}") for n in range(5)]
+    unknown = Identity.from_seed("unregistered").address
+
+    targets = [r.delegate_address for r in receivers]
+    unroutable = sender.broadcast(
+        targets + [unknown, targets[0]], "hello", batch_size=2
+    )
+
+    assert unroutable == [unknown]
+    assert memorandum.dispatches == [2, 2, 1]
+    for receiver in receivers:
+        assert [msg.text for msg in receiver.receive()] == ["hello"]
+
+    # the resolved keys are cached for the following sends
+    def no_lookup(token, address, chain_id):
+        raise AssertionError("unexpected lookup")
+
+    monkeypatch.setattr(babble.client, "lookup_messaging_public_key", no_lookup)
+    sender.send(targets[1], "again")
+    assert [msg.text for msg in receivers[1].receive()] == ["again"]
+
+
+def test_two_phase_receive(memorandum):
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind")
+
+    client1.send(client2.delegate_address, "old")
+    assert [msg.text for msg in client2.receive()] == ["old"]
+
+    client1.send(client2.delegate_address, "new")
+    client2.send(client1.delegate_address, "reply")
+
+    # only the contents of the new messages for this delegate are fetched
+    memorandum.fetched_contents.clear()
+    assert [msg.text for msg in client2.receive()] == ["new"]
+    assert memorandum.fetched_contents == [memorandum.messages[1].id]
+
+    # fall back to the single query form when the server can't fetch by id
+    memorandum.supports_fetch_by_id = False
+    assert [msg.text for msg in client1.receive()] == ["reply"]
+    assert not client1._two_phase_fetch
+
+
+def test_streaming_receive(memorandum):
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind")
+
+    # the client can be used from the loop body, the cursor is already moved forward
+    client1.send(client2.delegate_address, "first")
+    client1.send(client2.delegate_address, "second")
+    texts = []
+    for message in client2.iter_receive():
+        assert client2.receive() == []
+        texts.append(message.text)
+    assert texts == ["first", "second"]
+
+    # so can the cursor, the messages after it are delivered again
+    client1.send(client2.delegate_address, "third")
+    for message in client2.iter_receive():
+        client2.last_rx_timestamp = memorandum.messages[0].sent_at
+    assert [msg.text for msg in client2.receive()] == ["second", "third"]
+
+    # chunks are streamed straight into the assembler
+    payload = os.urandom(5000)
+    transfer_id = client1.send_chunked(client2.delegate_address, payload, 1024, 2)
+    client1.send(client2.delegate_address, "after")
+
+    sink = io.BytesIO()
+    assembler = ChunkAssembler(sink, transfer_id)
+    others = client2.receive_chunks(assembler)
+    assert [msg.text for msg in others] == ["after"]
+    assert assembler.complete
+    assert sink.getvalue() == payload
+
+
+def test_fetch_contents_unsupported(monkeypatch):
+    import babble.mailbox
+    import requests
+
+    def responding(status_code, body):
+        def post(url, **kwargs):
+            r = requests.Response()
+            r.status_code = status_code
+            r.elapsed = timedelta(0)
+            r.raw = io.BytesIO(json.dumps(body).encode())
+            return r
+
+        return post
+
+    def fetch():
+        return list(babble.mailbox.iter_message_contents("token", ["1"]))
+
+    # the contents are streamed
+    messages = [{"id": "1", "contents": "abc"}, {"id": "2", "contents": "def"}]
+    body = {"data": {"mailbox": {"messages": messages}}}
+    monkeypatch.setattr(babble.mailbox.requests, "post", responding(200, body))
+    assert fetch() == [("1", "abc")]
+
+    # schema errors mean the server can't select messages by id
+    body = {"errors": [{"message": 'Unknown argument "ids"'}], "data": None}
+    monkeypatch.setattr(babble.mailbox.requests, "post", responding(200, body))
+    with pytest.raises(UnsupportedQueryError):
+        fetch()
+
+    monkeypatch.setattr(babble.mailbox.requests, "post", responding(400, {}))
+    with pytest.raises(UnsupportedQueryError):
+        fetch()
+
+    # other errors are raised as is, rather than disabling the two-phase fetch
+    body = {"errors": [{"message": "Internal server error"}], "data": None}
+    monkeypatch.setattr(babble.mailbox.requests, "post", responding(200, body))
+    with pytest.raises(ChitchatError) as err:
+        fetch()
+    assert not isinstance(err.value, UnsupportedQueryError)
+
+    # errors in the body of a dispatch are not mistaken for a delivery
+    def failing(query, **kwargs):
+        return {"errors": [{"message": "Internal server error"}], "data": None}
+
+    monkeypatch.setattr(babble.mailbox, "_execute", failing)
+    with pytest.raises(ChitchatError):
+        babble.mailbox.dispatch_messages("token", ["envelope"])
@@ -0,0 +1,65 @@
+import base64
+import hashlib
+
+import ecdsa
+import pytest
+from babble import Identity
+from babble.crypto import identity as identity_module
+
+
+def test_compact_identity():
+    identity = Identity.from_seed("the wise mans fear")
+
+    assert not hasattr(identity, "__dict__")
+    assert identity.address == "fetch1epu7v922jk33y445yrzjmtqvrtektuwj5p3m62"
+    assert len(bytes.fromhex(identity.public_key)) == 33
+    assert identity._address == identity.address  # cached after first use
+
+
+def test_bulk_identities():
+    seeds = [f"seed {n}" for n in range(10)]
+    identities = Identity.from_seeds(seeds)
+
+    # the public keys are derived in bulk, up front
+    assert all(i._public_key is not None for i in identities)
+    assert [i.address for i in identities] == [
+        Identity.from_seed(seed).address for seed in seeds
+    ]
+
+
+def test_invalid_private_key():
+    with pytest.raises(ValueError):
+        Identity(b"\x00" * 32)
+    with pytest.raises(ValueError):
+        Identity(b"\x01" * 31)
+
+
+def test_signature_verifies():
+    identity = Identity.generate()
+    signature = base64.b64decode(identity.sign(b"payload"))
+
+    vk = ecdsa.VerifyingKey.from_string(
+        bytes.fromhex(identity.public_key),
+        curve=ecdsa.SECP256k1,
+        hashfunc=hashlib.sha256,
+    )
+    assert vk.verify(signature, b"payload")
+
+
+def test_signing_key_cache():
+    identity = Identity.generate()
+    identity.sign(b"payload")
+    assert identity_module._signing_key.cache_info().currsize > 0
+
+    identity_module.clear_signing_key_cache()
+    assert identity_module._signing_key.cache_info().currsize == 0
+
+    # a disabled cache keeps no keys alive
+    identity_module.set_signing_key_cache_size(0)
+    try:
+        identity.sign(b"payload")
+        assert identity_module._signing_key.cache_info().currsize == 0
+    finally:
+        identity_module.set_signing_key_cache_size(
+            identity_module.SIGNING_KEY_CACHE_SIZE
+        )
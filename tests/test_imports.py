@@ -0,0 +1,54 @@
+import hashlib
+import subprocess
+import sys
+
+HEAVY_MODULES = ("requests", "pydantic", "jwt", "ecies", "Crypto")
+
+# pycryptodome is only needed when OpenSSL does not provide RIPEMD160
+try:
+    hashlib.new("ripemd160")
+except ValueError:
+    CRYPTO_MODULES = {"requests", "pydantic", "jwt", "ecies"}
+else:
+    CRYPTO_MODULES = set(HEAVY_MODULES)
+
+
+def loaded_modules(statement: str) -> set:
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            f"import sys; {statement}; print(' '.join(sys.modules))",
+        ],
+        text=True,
+    )
+    return {name.split(".")[0] for name in output.split()}
+
+
+def test_package_import_is_lazy():
+    modules = loaded_modules("import babble")
+    assert "babble" in modules
+    assert not modules & {*HEAVY_MODULES, "ecdsa", "bech32"}
+
+
+def test_identity_does_not_load_client_stack():
+    modules = loaded_modules(
+        "from babble import Identity; "
+        "identity = Identity.from_seed('seed'); "
+        "identity.sign(identity.address.encode())"
+    )
+    assert not modules & CRYPTO_MODULES
+
+
+def test_lazy_attributes():
+    import babble
+
+    assert babble.Client.__name__ == "Client"
+    assert {
+        "ChunkAssembler",
+        "Client",
+        "Identity",
+        "Message",
+        "MessageStore",
+        "Outbox",
+    } <= set(dir(babble))
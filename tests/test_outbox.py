@@ -0,0 +1,163 @@
+import time
+from types import SimpleNamespace
+
+import babble.client
+import pytest
+from babble import Outbox
+from babble.outbox import OutboxFlusher
+
+
+def test_outbox_durable_flush(tmp_path):
+    path = str(tmp_path / "outbox.db")
+
+    outbox = Outbox(path, batch_size=2)
+    outbox.put_many(["a", "b", "c"])
+    outbox.put("d")
+    outbox.close()
+
+    # queued envelopes survive a restart
+    outbox = Outbox(path, batch_size=2)
+    assert len(outbox) == 4
+
+    def failing(batch):
+        raise ConnectionError("server blip")
+
+    with pytest.raises(ConnectionError):
+        outbox.flush(failing)
+    assert len(outbox) == 4
+
+    batches = []
+    assert outbox.flush(batches.append) == 4
+    assert batches == [["a", "b"], ["c", "d"]]
+    assert len(outbox) == 0
+
+
+def test_outbox_flusher_retries(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    outbox.put_many(["a", "b"])
+
+    attempts = []
+
+    def flaky(batch):
+        attempts.append(batch)
+        if len(attempts) == 1:
+            raise ConnectionError("server blip")
+
+    flusher = OutboxFlusher(outbox, flaky, interval=0.01).start()
+    deadline = time.monotonic() + 5
+    while len(outbox) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    flusher.stop()
+
+    assert len(outbox) == 0
+    assert attempts == [["a", "b"], ["a", "b"]]
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+def test_outbox_dead_letters(tmp_path):
+    dead = []
+    outbox = Outbox(
+        str(tmp_path / "outbox.db"),
+        max_attempts=2,
+        on_dead_letter=lambda envelopes, err: dead.extend(envelopes),
+    )
+
+    # rejected batches are bisected, only the bad envelope is dead lettered
+    outbox.put_many(["a", "bad", "c", "d"])
+    batches = []
+
+    def dispatch(batch):
+        if "bad" in batch:
+            raise HTTPError(400)
+        batches.append(batch)
+
+    assert outbox.flush(dispatch) == 3
+    assert batches == [["a"], ["c", "d"]]
+    assert dead == ["bad"]
+
+    # transient failures are retried, up to the maximum attempts
+    outbox.put("e")
+
+    def failing(batch):
+        raise ConnectionError("server down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            outbox.flush(failing)
+
+    assert len(outbox) == 0
+    assert dead == ["bad", "e"]
+    assert outbox.dead_letters() == ["bad", "e"]
+
+
+def test_outbox_auth_failures_are_transient(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), batch_size=4, max_attempts=2)
+    outbox.put_many([str(n) for n in range(8)])
+
+    # an expired token or a timeout neither bisects nor dead letters the queue
+    for status_code in (401, 403, 408, 401, 401):
+
+        def failing(batch):
+            raise HTTPError(status_code)
+
+        with pytest.raises(HTTPError):
+            outbox.flush(failing)
+
+    assert len(outbox) == 8
+    assert outbox.dead_letters() == []
+
+    batches = []
+    assert outbox.flush(batches.append) == 8
+
+
+def test_client_reauthenticates_on_401(memorandum, monkeypatch):
+    receiver = memorandum.client("the name of the wind")
+    sender = memorandum.client("the wise mans fear")
+
+    logins = []
+    authenticate = memorandum.authenticate
+    dispatch = memorandum.dispatch_messages
+
+    def counting_authenticate(identity, name=None):
+        logins.append(identity.address)
+        return authenticate(identity, name)
+
+    def expiring_dispatch(token, messages):
+        if len(logins) == 0:
+            raise HTTPError(401)
+        dispatch(token, messages)
+
+    monkeypatch.setattr(babble.client, "authenticate", counting_authenticate)
+    monkeypatch.setattr(babble.client, "dispatch_messages", expiring_dispatch)
+
+    sender.send(receiver.delegate_address, "hello")
+    assert len(logins) == 1
+    assert [msg.text for msg in receiver.receive()] == ["hello"]
+
+
+def test_client_outbox(memorandum, monkeypatch, tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    receiver = memorandum.client("the name of the wind")
+    sender = memorandum.client("the wise mans fear", outbox=outbox)
+
+    lookups = []
+
+    def lookup(token, address, chain_id):
+        lookups.append(address)
+        return memorandum.lookup_messaging_public_key(token, address, chain_id)
+
+    monkeypatch.setattr(babble.client, "lookup_messaging_public_key", lookup)
+
+    # the target key is cached, so queued sends don't wait on the server
+    for n in range(5):
+        sender.send(receiver.delegate_address, f"msg {n}")
+    assert lookups == [receiver.delegate_address]
+    sender.close()
+
+    assert sum(memorandum.dispatches) == 5
+    assert [msg.text for msg in receiver.receive()] == [f"msg {n}" for n in range(5)]
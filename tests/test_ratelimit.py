@@ -0,0 +1,130 @@
+import io
+import json
+import threading
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+
+import babble.mailbox
+import babble.ratelimit
+import pytest
+import requests
+from babble.config import DEFAULT_REQUEST_TIMEOUT
+from babble.ratelimit import MAILBOX, AdaptiveLimiter, TokenBucket
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=100.0, burst=5)
+
+    start = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    elapsed = time.monotonic() - start
+
+    # the burst is immediate, the remaining 10 tokens take ~0.1s
+    assert 0.08 <= elapsed < 1.0
+
+
+def test_aimd_concurrency_limit():
+    limiter = AdaptiveLimiter(
+        initial_concurrency=4, max_concurrency=8, decrease_cooldown=0
+    )
+
+    # light (serial) traffic does not grow the limit
+    for _ in range(100):
+        with limiter.acquire():
+            pass
+    assert limiter.limit == 4
+
+    # additive increase on success at the limit, bounded by the maximum
+    for _ in range(100):
+        with ExitStack() as stack:
+            for _ in range(int(limiter.limit)):
+                stack.enter_context(limiter.acquire())
+    assert limiter.limit == 8
+
+    # multiplicative decrease on overload and on errors
+    with limiter.acquire() as slot:
+        slot.overloaded = True
+    assert limiter.limit == 4
+
+    with pytest.raises(RuntimeError):
+        with limiter.acquire():
+            raise RuntimeError("connection reset")
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+
+
+def test_aimd_latency_and_cooldown():
+    limiter = AdaptiveLimiter(initial_concurrency=8, latency_target=0.01)
+
+    with limiter.acquire():
+        time.sleep(0.02)
+    assert limiter.limit == 4
+
+    # further slow requests in the same window do not back off again
+    with limiter.acquire():
+        time.sleep(0.02)
+    assert limiter.limit == 4
+
+
+def test_concurrency_is_bounded():
+    limiter = AdaptiveLimiter(initial_concurrency=2, max_concurrency=2)
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal peak
+        with limiter.acquire():
+            with lock:
+                peak = max(peak, limiter.in_flight)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == 2
+
+
+def test_streamed_response_holds_slot(monkeypatch):
+    limiter = AdaptiveLimiter(initial_concurrency=4, latency_target=0.01)
+    monkeypatch.setitem(babble.ratelimit._limiters, MAILBOX, limiter)
+
+    messages = [
+        {
+            "id": str(n),
+            "groupId": "",
+            "sender": "sender",
+            "target": "target",
+            "expiryTimestamp": 2000,
+            "commitTimestamp": 1000,
+        }
+        for n in range(3)
+    ]
+
+    def post(url, **kwargs):
+        assert (
+            kwargs["timeout"] == DEFAULT_REQUEST_TIMEOUT
+        )  # a hung read can't pin the slot
+        r = requests.Response()
+        r.status_code = 200
+        r.elapsed = timedelta(seconds=0.001)
+        r.raw = io.BytesIO(
+            json.dumps({"data": {"mailbox": {"messages": messages}}}).encode()
+        )
+        return r
+
+    monkeypatch.setattr(babble.mailbox.requests, "post", post)
+
+    headers = babble.mailbox.iter_message_headers("token")
+    assert next(headers).id == "0"
+    assert limiter.in_flight == 1
+
+    # a slow consumer is not mistaken for a slow server
+    time.sleep(0.02)
+    assert [header.id for header in headers] == ["1", "2"]
+    assert limiter.in_flight == 0
+    assert limiter.limit == 4
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from babble import Message, MessageStore
+
+
+def make_message(n: int, sender: str, sent_at: datetime, ttl: timedelta) -> Message:
+    return Message(
+        id=str(n),
+        sender=sender,
+        target="target",
+        text=f"message {n}",
+        sent_at=sent_at,
+        expires_at=sent_at + ttl,
+    )
+
+
+def test_store_queries(tmp_path):
+    store = MessageStore(str(tmp_path / "history.db"))
+
+    start = datetime.now(timezone.utc)
+    messages = [
+        make_message(n, f"sender{n % 2}", start + timedelta(seconds=n), timedelta(1))
+        for n in range(10)
+    ]
+    store.add_many(messages)
+    store.add_many(messages[:3])  # duplicates are ignored
+    assert len(store) == 10
+
+    assert store.get("4") == messages[4]
+    assert store.get("missing") is None
+
+    from_sender = store.query(sender="sender1", since=start + timedelta(seconds=3))
+    assert [m.id for m in from_sender] == ["5", "7", "9"]
+
+    assert store.query(until=start + timedelta(seconds=1)) == messages[:2]
+    assert len(store.query(target="target", limit=4)) == 4
+
+
+def test_store_retention():
+    now = datetime.now(timezone.utc)
+    expired = make_message(0, "sender", now - timedelta(days=2), timedelta(days=1))
+
+    # expired messages are kept unless asked otherwise
+    store = MessageStore(max_messages=3)
+    store.add_many([expired])
+    assert len(store) == 1
+
+    store.add_many(
+        make_message(n, "sender", now + timedelta(seconds=n), timedelta(days=1))
+        for n in range(1, 6)
+    )
+    assert [m.id for m in store.query()] == ["3", "4", "5"]
+
+    store = MessageStore(retain_expired=False)
+    store.add_many([expired])
+    assert len(store) == 0
+
+
+def test_store_naive_datetime():
+    store = MessageStore()
+    with pytest.raises(ValueError):
+        store.query(since=datetime.now())
+
+
+def test_client_store(memorandum):
+    store = MessageStore()
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind", store=store)
+
+    client1.send(client2.delegate_address, "hello")
+    client1.send(client2.delegate_address, "again")
+    received = client2.receive()
+
+    assert store.query(sender=client1.delegate_address) == received
+
+
+def test_client_store_failure(memorandum, monkeypatch):
+    store = MessageStore()
+    client1 = memorandum.client("the wise mans fear")
+    client2 = memorandum.client("the name of the wind", store=store)
+
+    client1.send(client2.delegate_address, "hello")
+
+    add_many = store.add_many
+    failures = [OSError("disk full")]
+
+    def flaky(messages):
+        if failures:
+            raise failures.pop()
+        add_many(messages)
+
+    # a failed write leaves the cursor in place, the message is received again
+    monkeypatch.setattr(store, "add_many", flaky)
+    with pytest.raises(OSError):
+        client2.receive()
+
+    assert [msg.text for msg in client2.receive()] == ["hello"]
+    assert len(store) == 1